@@ -1,5 +1,5 @@
 import numpy as np
-from netCDF4 import Dataset
+from pycascades.amazon import raster_index
 import glob
 
 #plotting imports
@@ -47,30 +47,9 @@ np.savetxt("risk_map_std_{}.txt".format(name), output_std)
 ########PLOTTING STRUCTURE
 print("Plotting sequence")
 #get lat lon values from 
-net_data = Dataset(np.sort(glob.glob("../data/*.nc"))[0])
-
-
-#latlon values
-lat = net_data.variables["lat"][:]
-lon = net_data.variables["lon"][:]
-
-tuples = [(lat[idx],lon[idx]) for idx in range(lat.size)]
-
-lat = np.unique(lat)
-lon = np.unique(lon)
-lat = np.append(lat, lat[-1]+lat[-1]-lat[-2]) #why do we need to append lat[-1]+lat[-1]-lat[-2]???
-lon = np.append(lon, lon[-1]+lon[-1]-lon[-2])
-
-vals_mean_no = np.empty((lat.size,lon.size))
-vals_mean_no[:,:] = np.nan
-vals_std_no = np.empty((lat.size,lon.size))
-vals_std_no[:,:] = np.nan
-
-for idx,x in enumerate(lat):
-    for idy,y in enumerate(lon):
-        if (x,y) in tuples:
-            vals_mean_no[idx,idy] = output_mean[tuples.index((x,y))]
-            vals_std_no[idx,idy] = output_std[tuples.index((x,y))]
+raster = raster_index.from_dataset(np.sort(glob.glob("../data/*.nc"))[0])
+lat, lon = raster.get_grid()
+vals_mean_no, vals_std_no = raster.scatter(np.array([output_mean, output_std]))
 
 
 #Plotting Mean
@@ -154,28 +133,9 @@ np.savetxt("risk_map_std_{}.txt".format(name), output_std)
 ########PLOTTING STRUCTURE
 print("Plotting sequence")
 #get lat lon values from 
-net_data = Dataset(np.sort(glob.glob("../data/*.nc"))[0])
-#latlon values
-lat = net_data.variables["lat"][:]
-lon = net_data.variables["lon"][:]
-
-tuples = [(lat[idx],lon[idx]) for idx in range(lat.size)]
-
-lat = np.unique(lat)
-lon = np.unique(lon)
-lat = np.append(lat, lat[-1]+lat[-1]-lat[-2]) #why do we need to append lat[-1]+lat[-1]-lat[-2]???
-lon = np.append(lon, lon[-1]+lon[-1]-lon[-2])
-
-vals_mean_with = np.empty((lat.size,lon.size))
-vals_mean_with[:,:] = np.nan
-vals_std_with = np.empty((lat.size,lon.size))
-vals_std_with[:,:] = np.nan
-
-for idx,x in enumerate(lat):
-    for idy,y in enumerate(lon):
-        if (x,y) in tuples:
-            vals_mean_with[idx,idy] = output_mean[tuples.index((x,y))]
-            vals_std_with[idx,idy] = output_std[tuples.index((x,y))]
+raster = raster_index.from_dataset(np.sort(glob.glob("../data/*.nc"))[0])
+lat, lon = raster.get_grid()
+vals_mean_with, vals_std_with = raster.scatter(np.array([output_mean, output_std]))
 
 
 #Plotting Mean
@@ -4,7 +4,6 @@ import networkx as nx
 import glob
 import pycascades as pc
 
-from netCDF4 import Dataset
 
 #plotting imports
 import matplotlib
@@ -66,9 +65,13 @@ print(data_eval)
 
 
 ###MAIN###
+#the network is generated once, its critical rainfall is changed in place
+net = pc.amazon.generate_network(r_critical[0], data_eval, no_cpl_dummy)
+#grid positions of the cells for the risk maps
+raster = pc.amazon.raster_index.from_dataset(data_eval[0])
 for r_crit in r_critical:
     print("r_crit: ", r_crit)
-    net = pc.amazon.generate_network(r_crit, data_eval, no_cpl_dummy)
+    net.set_rain_critical(r_crit)
 
     output = []
 
@@ -91,27 +94,8 @@ for r_crit in r_critical:
 
     #plotting procedure
     print("Plotting sequence")
-    dataset = data_eval[0]
-    net_data = Dataset(dataset)
-    #latlon values
-    lat = net_data.variables["lat"][:]
-    lon = net_data.variables["lon"][:]
-
-
-    tuples = [(lat[idx],lon[idx]) for idx in range(lat.size)]
-
-    lat = np.unique(lat)
-    lon = np.unique(lon)
-    lat = np.append(lat, lat[-1]+lat[-1]-lat[-2]) #why do need to append lat[-1]+lat[-1]-lat[-2]???
-    lon = np.append(lon, lon[-1]+lon[-1]-lon[-2])
-    vals = np.empty((lat.size,lon.size))
-    vals[:,:] = np.nan
-
-    for idx,x in enumerate(lat):
-        for idy,y in enumerate(lon):
-            if (x,y) in tuples:
-                p = unstable_amaz[tuples.index((x,y))]
-                vals[idx,idy] = p
+    lat, lon = raster.get_grid()
+    vals = raster.scatter(unstable_amaz)
 
 
     plt.rc('text', usetex=True)
@@ -70,6 +70,9 @@ earth_system = pc.earth_system.Earth_System(gis_time, thc_time, wais_time, amaz_
                             pf_wais_to_gis, pf_thc_to_gis, pf_gis_to_thc,
                             pf_wais_to_thc, pf_gis_to_wais, pf_thc_to_wais, pf_thc_to_amaz)
 
+#results of all runs (Monte Carlo samples and link configurations) are collected in one file
+store = pc.earth_system.result_store("{}/feedbacks.nc".format(long_save_name), pc.earth_system.monte_carlo.RESULT_DTYPE)
+
 ################################# MAIN LOOP #################################
 for kk in plus_minus_links:
     print("Wais to Thc:{}".format(kk[0]))
@@ -89,12 +92,7 @@ for kk in plus_minus_links:
         os.stat("{}/feedbacks/network_{}_{}/{}".format(long_save_name, kk[0], kk[1], str(mc_dir).zfill(4) ))
     except:
         os.mkdir("{}/feedbacks/network_{}_{}/{}".format(long_save_name, kk[0], kk[1], str(mc_dir).zfill(4) ))
-    
-    #save starting conditions
-    np.savetxt("{}/feedbacks/network_{}_{}/{}/empirical_values.txt".format(long_save_name, kk[0], kk[1], str(mc_dir).zfill(4)), sys_var)
-
 
-    output = []
 
     state_before = [-1, -1, -1, -1] #initial state
     #get back the network of the Earth system
@@ -131,31 +129,11 @@ for kk in plus_minus_links:
 
 
 
-    #saving structure
-    output.append([GMT,
-                   ev.get_timeseries()[1][-1, 0],
-                   ev.get_timeseries()[1][-1, 1],
-                   ev.get_timeseries()[1][-1, 2],
-                   ev.get_timeseries()[1][-1, 3],
-                   net.get_number_tipped(ev.get_timeseries()[1][-1]),
-                   [net.get_tip_states(ev.get_timeseries()[1][-1])[0]].count(True),
-                   [net.get_tip_states(ev.get_timeseries()[1][-1])[1]].count(True),
-                   [net.get_tip_states(ev.get_timeseries()[1][-1])[2]].count(True),
-                   [net.get_tip_states(ev.get_timeseries()[1][-1])[3]].count(True)
-                   ])
-
-
-
-    #necessary for break condition
-    if len(output) != 0:
-        #saving structure
-        data = np.array(output)
-        np.savetxt("{}/feedbacks/network_{}_{}/{}/feedbacks_{:.2f}.txt".format(long_save_name, kk[0], kk[1], str(mc_dir).zfill(4), strength), data)
-        gmt = data.T[0]
-        state_gis = data.T[1]
-        state_thc = data.T[2]
-        state_wais = data.T[3]
-        state_amaz = data.T[4]
+    #saving structure: one row with the parameters and results of the run, appended to the result store
+    final_state = ev.get_timeseries()[1][-1]
+    tip_states = net.get_tip_states(final_state)
+    store.append([(mc_dir, kk[0], kk[1], *sys_var[:11], GMT, strength,
+                   *final_state, np.count_nonzero(tip_states), *tip_states)])
 
 
 # it is necessary to limit the amount of saved files
@@ -1,41 +1,29 @@
 import os
-import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-sns.set(font_scale=1.5)
-import re
-import glob
+import pycascades as pc
 
 
 
-# read all files
-networks = np.array(np.sort(glob.glob("../results/feedbacks/*")))
+# read the results of all runs, results of the former layout (one folder per run) are imported once
+if os.path.exists("../results/feedbacks.nc"):
+    store = pc.earth_system.result_store("../results/feedbacks.nc")
+else:
+    store = pc.earth_system.result_store.from_directory("../results/feedbacks", "../results/feedbacks.nc")
 
+#number of tipped elements and runs for each link configuration
+output = store.aggregate(["wais_to_thc", "thc_to_amaz"], ["tipped_gis", "tipped_thc", "tipped_wais", "tipped_amaz"])
 
-for network in networks:
-    print(network)
-    output = []
-    final = []
-    net_splitter = re.split("network", network)[-1] #used for the saving structure
-    folders = np.array(np.sort(glob.glob(network + "/0*"))) #do not collect special folders which start with a "-"
-    for folder in folders:
-        subfolders = np.array(np.sort(glob.glob(folder + "/feedbacks_*.txt")))
-        for kk in subfolders:
-            file = np.loadtxt(kk)
-            final.append([file[6], file[7], file[8], file[9], 1])
-    final = np.array(final)
 
-
-    output.append([
-        np.sum(final.T[0]), np.sum(final.T[1]), np.sum(final.T[2]), np.sum(final.T[3]), np.sum(final.T[4])
-        ])
-    output = np.array(output)
-    print(output)
+for network in output:
+    net_splitter = "_{}_{}".format(network["wais_to_thc"], network["thc_to_amaz"]) #used for the saving structure
+    print(net_splitter)
+    summary = np.array([[network["tipped_gis"], network["tipped_thc"], network["tipped_wais"], network["tipped_amaz"],
+                         network["count"]]])
+    print(summary)
 
 
     #Plot structure and saving structure
-    np.savetxt("plots/network{}.txt".format(net_splitter), output)
+    np.savetxt("plots/network{}.txt".format(net_splitter), summary)
 
 
-print("Finish")
\ No newline at end of file
+print("Finish")
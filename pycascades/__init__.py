@@ -16,4 +16,5 @@ from pycascades.core.coupling_economic import linear_coupling as linear_coupling
 from pycascades.core.evolve import evolve
 from pycascades.core.evolve_sde import evolve as evolve_sde
 from pycascades.core.evolve_economic import evolve as evolve_economic
+from pycascades.core.observers import tip_time_recorder
 from pycascades.utils import plotter
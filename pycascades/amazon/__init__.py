@@ -1,5 +1,4 @@
+from . import cache, amazon, raster
 
-
-from . import amazon
-
-from pycascades.amazon.amazon import generate_network
\ No newline at end of file
+from pycascades.amazon.amazon import generate_network
+from pycascades.amazon.raster import raster_index
@@ -1,13 +1,11 @@
 
 
 from pycascades.core.tipping_network import tipping_network
-from pycascades.core.tipping_element import cusp
-from pycascades.core.coupling import linear_coupling
+from pycascades.amazon import cache
 
 
 from netCDF4 import Dataset
 
-import networkx as nx
 import numpy as np
 
 
@@ -48,7 +46,7 @@ def Amazon_cpl(a, b, rain_critical, rain_current, rain_mean, delta_rain):
     cpl = np.sqrt((4*np.abs(b)**3) / (27*np.abs(a)))/(rain_mean - rain_critical)*(1/2)*(-1)*delta_rain
 
 
-    if cpl < 0.0:
+    if np.any(cpl < 0.0):
         raise ValueError("Coupling strengths below 0.0 are not allowed")
         
     return cpl
@@ -63,89 +61,120 @@ def Rain_moisture_delta_only(moist_rec_val):
     return rain_moist
 
 
-def generate_network(rain_crit, data_eval, no_cpl_dummy): 
-    net = tipping_network()
-
-    #get longitude and latitude values, for that use first network
-    net_data = Dataset(data_eval[0])
-    lon_x = net_data.variables["lon"][:]
-    lat_y = net_data.variables["lat"][:]
-
-    #rainfall value
-    rain = Rain(data_eval)
-    rain_mean = np.nanmean(rain)
-
-    for idx, val in enumerate(lon_x):
-        #constants that are necessary to set up the tipping network
-        rain_current = rain[idx] #rainfall in a certain cell
-        rain_critical = rain_crit #critical rainfall of a certain cell
-
-        a = 1
-        b = 1
-        element = cusp( a = -1, b = 1, c = Amazon_CUSPc(a, b, rain_current, rain_critical, rain_mean), x_0 = 0)
-        net.add_element(element)
-        net.nodes[idx]['pos'] = (val, lat_y[idx])
-
-
+def network_arrays(rain_crit, data_eval, no_cpl_dummy, cpl_limit=1.0):
+    """
+    Node and edge arrays of the Amazon rainforest network (see generate_network):
+    lon, lat, rain (per cell), rain_mean, c (cusp c per cell), from_id, to_id and strength (per link)
+    """
+    #get longitude and latitude values, rainfall and the moisture recycling network, each file is read once
+    rain = []
     flows_xy_total = []
     for data in data_eval:
-        data_file = Dataset(data)
-        flows_xy_total.append(data_file.variables["network"][:, :])
+        net_data = Dataset(data)
+        if len(flows_xy_total) == 0:
+            lon_x = np.array(net_data.variables["lon"][:])
+            lat_y = np.array(net_data.variables["lat"][:])
+        rain_dataset = net_data.variables["rain"][:]
+        if len(rain) == 0:
+            rain = rain_dataset
+        else:
+            rain = np.add(rain, rain_dataset)
+        flows_xy_total.append(np.array(net_data.variables["network"][:, :]))
+    rain = np.array(rain)
+    rain_mean = np.nanmean(rain)
     flows_xy_total = np.array(flows_xy_total)
 
-    #compute total moisture recycling within a year
-    flows_xy = Dataset(data_eval[0]).variables["network"][:, :]
-    it = np.nditer(flows_xy, flags=['multi_index'])
-
+    #constants that are necessary to set up the tipping network
+    a = 1
+    b = 1
+    c = Amazon_CUSPc(a, b, rain, rain_crit, rain_mean)
 
-    couplings = []
-    while not it.finished:
-        if not it.multi_index[0] == it.multi_index[1]:
-            ###########
-            #need to get value for each month
-            monthly = []
-            for i in range(0, len(flows_xy_total)):
-                monthly.append(flows_xy_total[i, it.multi_index[0], it.multi_index[1]])
+    #compute total moisture recycling within a year, edges from column (from) to row (to) without self-links
+    flows_xy = flows_xy_total.sum(axis=0)
+    np.fill_diagonal(flows_xy, 0.)
+    #Resolution dependent coupling limit: Setting where couplings below cpl_limit mm/year are neglected; default value 1.0 mm
+    to_id, from_id = np.nonzero(flows_xy > cpl_limit)
+    totals = flows_xy[to_id, from_id]
+    order = np.argsort(totals, kind="stable")
+    to_id, from_id, totals = to_id[order], from_id[order], totals[order]
 
-            appender = [it.multi_index[1], it.multi_index[0], np.sum(monthly)]
-            for i in monthly:
-                appender.append(i)
-            couplings.append([i for i in appender])
-        it.iternext()
+    if no_cpl_dummy == True:
+        strength = np.zeros(totals.size)
+    else:
+        #get the difference between rainfall in the respective cell after[rain_new] and before[rain_old] tipping
+        delta_rain = -totals #delta_rain is a negative number
+        #Amount of change of MCWD is the coupling strength
+        strength = Amazon_cpl(a, b, rain_crit, rain[to_id], rain_mean, delta_rain)
 
-    couplings = np.array(couplings)
-    couplings = np.array(sorted(couplings, key=lambda x: x[2]))
+    return {"lon": lon_x, "lat": lat_y, "rain": rain, "rain_mean": np.array(rain_mean), "c": c,
+            "from_id": from_id, "to_id": to_id, "strength": strength}
 
 
-    #sort out zero values in array
-    cpl_hist = np.array(couplings).T[2]
-    start_idx = len(couplings) - np.count_nonzero(cpl_hist)#count length of zeros
-    couplings = np.array(couplings[start_idx:]) # sort out where couplings are zero
+class amazon_network(tipping_network):
+    """
+    Amazon rainforest network, see generate_network. The cusp c values and the coupling strengths depend on the
+    critical rainfall only through the factors 1/(rain_critical - rain_mean) and 1/(rain_mean - rain_critical),
+    set_rain_critical rescales them in place, i.e. sweeps over rain_critical reuse one network
+    """
 
+    def _set_reference(self, rain_crit, rain_mean):
+        """
+        Store c and the strengths for unit factors, the network was built for rain_crit
+        """
+        kernel = self.get_kernel()
+        self._rain_crit = float(rain_crit)
+        self._rain_mean = float(rain_mean)
+        self._c_unit = kernel.get_par("c") * (self._rain_crit - self._rain_mean)
+        self._strength_unit = kernel.get_strength() * (self._rain_mean - self._rain_crit)
+
+    def get_rain_critical(self):
+        return self._rain_crit
+
+    def set_rain_critical(self, rain_crit):
+        """
+        Rescale c and the coupling strengths to the critical rainfall rain_crit
+        """
+        self._rain_crit = float(rain_crit)
+        c = self._c_unit / (self._rain_crit - self._rain_mean)
+        strength = self._strength_unit / (self._rain_mean - self._rain_crit)
+        if np.any(strength < 0.0):
+            raise ValueError("Coupling strengths below 0.0 are not allowed")
+
+        self.set_params("c", c)
+        self.set_strengths(strength)
+
+
+def network_from_arrays(arrays, rain_crit):
+    """
+    Amazon rainforest network for the critical rainfall rain_crit from the arrays of network_arrays
+    (the node positions are (lon, lat))
+    """
+    net = amazon_network.from_arrays("cusp", {"a": -1, "b": 1, "c": arrays["c"], "x_0": 0},
+                                     np.array([arrays["from_id"], arrays["to_id"]]), arrays["strength"])
+    for idx, pos in enumerate(zip(arrays["lon"].tolist(), arrays["lat"].tolist())):
+        net.nodes[idx]['pos'] = pos
+    net._set_reference(rain_crit, arrays["rain_mean"])
+    return net
 
 
-    #Resolution dependent coupling limit: Setting where couplings below cpl_limit mm/year are neglected; default value 1.0 mm
-    cpl_limit = 1.0 # time to compute the new network sensitively depends on the coupling limit; 
-
-    for cpl in couplings:
-        if cpl[2] > cpl_limit:
-            if no_cpl_dummy == True:
-                coupling_object = linear_coupling(strength = 0.0)
-            else:
-                #get the difference between rainfall in the respective cell after[rain_new] and before[rain_old] tipping
-                delta_rain = Rain_moisture_delta_only([cpl[i] for i in range(3, len(cpl))]) #delta_rain is a negative number
-                #current and critical values are required for the rainfall and mcwd
-                rain_current = rain[int(cpl[1])]
-                rain_critical = rain_crit
-
-                #Amount of change of MCWD is the coupling strength
-                coupling_object = linear_coupling(strength = Amazon_cpl(a, b, rain_critical, rain_current, rain_mean, delta_rain))
-            net.add_coupling( int(cpl[0]), int(cpl[1]), coupling_object ) #needs to be saved as integer here
+def generate_network(rain_crit, data_eval, no_cpl_dummy, cpl_limit=1.0, cache_dir=None): 
+    """
+    Amazon rainforest network: one cusp per cell, linear couplings from cell j to cell i for the moisture recycling
+    network[i, j] summed over data_eval (e.g. the months of a year) above cpl_limit mm/yr.
+    The couplings are added in ascending order of the recycled moisture.
+    With cache_dir the network arrays are stored in and loaded (memory-mapped) from an on-disk cache, 
+    see pycascades.amazon.cache.
+    The critical rainfall of the returned network can be changed with set_rain_critical
+    """
+    if cache_dir is None:
+        arrays = network_arrays(rain_crit, data_eval, no_cpl_dummy, cpl_limit)
+    else:
+        key = cache.cache_key(data_eval, rain_crit, cpl_limit, no_cpl_dummy)
+        arrays = cache.load(cache_dir, key)
+        if arrays is None:
+            arrays = network_arrays(rain_crit, data_eval, no_cpl_dummy, cpl_limit)
+            cache.save(cache_dir, key, arrays)
+    net = network_from_arrays(arrays, rain_crit)
 
     print("Amazon rainforest network generated! Restriction: Only moisture recycling links above {} mm/yr are considered".format(cpl_limit))
-    d = net.number_of_edges() / net.number_of_nodes()
-    average_clustering = nx.average_clustering(net)
-    #print("Average degree: ", d)
-    #print("Average clustering: ", average_clustering)
     return net
-
@@ -0,0 +1,59 @@
+"""
+On-disk cache of Amazon rainforest networks: the node and edge arrays of network_arrays are stored as .npy files
+in one directory per network and loaded memory-mapped. The cache key is the hash of the contents of the input files,
+the critical rainfall, the coupling limit and no_cpl_dummy
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+#change if the stored arrays change
+CACHE_VERSION = "1"
+
+FIELDS = ["lon", "lat", "rain", "rain_mean", "c", "from_id", "to_id", "strength"]
+
+
+def cache_key(data_eval, rain_crit, cpl_limit, no_cpl_dummy):
+    """
+    sha256 of the input files (in the order of data_eval) and the parameters
+    """
+    key = hashlib.sha256()
+    key.update("amazon network {}".format(CACHE_VERSION).encode())
+    for data in data_eval:
+        with open(data, "rb") as data_file:
+            for block in iter(lambda: data_file.read(1 << 20), b""):
+                key.update(block)
+    key.update(repr((float(rain_crit), float(cpl_limit), bool(no_cpl_dummy))).encode())
+    return key.hexdigest()
+
+
+def load(cache_dir, key):
+    """
+    Memory-mapped arrays of the cached network or None if it is not in the cache
+    """
+    path = os.path.join(cache_dir, key)
+    if not os.path.isdir(path):
+        return None
+    return {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in FIELDS}
+
+
+def save(cache_dir, key, arrays):
+    """
+    Store the arrays of a network, the entry is written to a temporary directory and renamed when complete,
+    so concurrent runs never see partial entries
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp_")
+    try:
+        for name in FIELDS:
+            np.save(os.path.join(tmp_path, name + ".npy"), np.asarray(arrays[name]))
+        os.rename(tmp_path, os.path.join(cache_dir, key))
+    except OSError:
+        #another run stored the same entry first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(os.path.join(cache_dir, key)):
+            raise
@@ -0,0 +1,55 @@
+"""
+Raster index of the Amazon rainforest cells: maps per-node vectors onto the regular lat/lon grid of the dataset
+"""
+
+from netCDF4 import Dataset
+
+import numpy as np
+
+
+class raster_index():
+    """
+    Built once from the coordinates of the cells (nodes), scatter maps per-node values onto the grid with one
+    fancy-indexing operation. The grid has one extra row and column (always empty), as needed for the cell edges
+    of pcolor. If several nodes share a grid cell, the first one is used
+    """
+
+    def __init__(self, lat, lon):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        lat_unique = np.unique(lat)
+        lon_unique = np.unique(lon)
+        self._lat = np.append(lat_unique, lat_unique[-1] + lat_unique[-1] - lat_unique[-2])
+        self._lon = np.append(lon_unique, lon_unique[-1] + lon_unique[-1] - lon_unique[-2])
+        self._shape = (self._lat.size, self._lon.size)
+
+        #flat grid positions of the nodes, only the first node of a grid cell is kept
+        flat = np.searchsorted(lat_unique, lat) * self._shape[1] + np.searchsorted(lon_unique, lon)
+        self._cells, self._nodes = np.unique(flat, return_index=True)
+        self._number_of_nodes = lat.size
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """
+        Raster index from the lat and lon variables of a netCDF file
+        """
+        net_data = Dataset(dataset)
+        return cls(net_data.variables["lat"][:], net_data.variables["lon"][:])
+
+    def get_grid(self):
+        """
+        Returns the lat and lon values of the grid rows and columns
+        """
+        return self._lat, self._lon
+
+    def scatter(self, values, fill=np.nan):
+        """
+        Grid of shape (..., lat, lon) of the per-node values (shape (..., nodes)), empty cells are set to fill
+        """
+        values = np.asarray(values)
+        if values.shape[-1] != self._number_of_nodes:
+            raise ValueError("Last dimension of values must be the number of nodes.")
+        grid = np.full(values.shape[:-1] + (self._shape[0] * self._shape[1],), fill,
+                       dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+        grid[..., self._cells] = values[..., self._nodes]
+        return grid.reshape(values.shape[:-1] + self._shape)
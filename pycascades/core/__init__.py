@@ -1 +1 @@
-from . import coupling, coupling_economic, evolve_economic, evolve_sde, evolve, tipping_element, tipping_element_economic, tipping_network, tipping_network_economic
\ No newline at end of file
+from . import compiled, continuation, coupling, coupling_economic, evolve_economic, evolve_sde, evolve, observers, tipping_element, tipping_element_economic, tipping_network, tipping_network_economic, trajectory
\ No newline at end of file
@@ -0,0 +1,367 @@
+"""compiled module
+
+Provides an array-backed representation of a tipping_network.
+The parameters of all cusp and hopf elements are packed into contiguous 
+arrays and the linear couplings into a sparse matrix, so that f and jac can
+be evaluated with a few vectorized numpy operations instead of one lambda
+call per node and edge.
+"""
+import numpy as np
+from scipy.linalg import block_diag
+from scipy.sparse import csr_matrix
+
+class sparse_pattern:
+    """Fixed sparsity pattern of a n x n CSR matrix built from the 
+    (row, col) index pairs of its entries. Repeated index pairs share one
+    entry and are summed up on fill. fill overwrites the data array of the 
+    cached matrix in place and returns it, i.e. the returned matrix is 
+    changed by the next call of fill.
+    """
+
+    def __init__(self, n, rows, cols):
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        keys, self._pos = np.unique(rows * n + cols, return_inverse=True)
+        self._pos = self._pos.ravel()
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=indptr[1:])
+        self._mat = csr_matrix((np.zeros(keys.size), keys % n, indptr),
+                               shape=(n, n))
+
+    def fill(self, vals):
+        self._mat.data[:] = np.bincount(self._pos, weights=vals,
+                                        minlength=self._mat.data.size)
+        return self._mat
+
+# projections of periodic couplings, index of the projection code
+CONSTANT, COS, SIN = 0, 1, 2
+
+def element_form(element_type, par):
+    """Parameters (a, b, c, x_0) of the cusp form 
+    a*(x-x_0)^3 + b*(x-x_0) + c of an element. A hopf element
+    (c - r^2)*r*a is a cusp with a -> -a, b -> a*c, c -> 0 and x_0 -> 0."""
+    if element_type == 'cusp':
+        return par['a'], par['b'], par['c'], par['x_0']
+    if element_type == 'hopf':
+        return -par['a'], par['a'] * par['c'], 0., 0.
+    raise ValueError("Element type " + str(element_type) + 
+                     " cannot be compiled.")
+
+def coupling_form(coupling):
+    """Parameters (strength, projection, frequency, gain, shift) of a 
+    coupling term strength*projection(frequency*t)*(x_from - shift)*g(x_to)
+    with g = 1 for gain 0 and g = gain*x_to otherwise. Only linear 
+    couplings are shifted."""
+    cpl_type = coupling.get_type()
+    if cpl_type == 'linear':
+        return coupling._strength, CONSTANT, 0., 0., 0.
+    if cpl_type == 'linear_shifted':
+        return coupling._strength, CONSTANT, 0., 0., coupling._x_0
+    if cpl_type == 'cusp_to_hopf':
+        return coupling._strength, CONSTANT, 0., coupling._a, 0.
+    if cpl_type == 'hopf_x_to_cusp':
+        return coupling._strength, COS, coupling._b, 0., 0.
+    if cpl_type == 'hopf_y_to_cusp':
+        return coupling._strength, SIN, coupling._b, 0., 0.
+    if cpl_type == 'hopf_x_to_hopf':
+        return coupling._strength, COS, coupling._b_from, coupling._a_to, 0.
+    if cpl_type == 'hopf_y_to_hopf':
+        return coupling._strength, SIN, coupling._b_from, coupling._a_to, 0.
+    raise ValueError("Coupling type " + str(cpl_type) + " cannot be "
+                     "compiled.")
+
+class compiled_network:
+    """Array representation of a network of cusp and hopf elements:
+        f = a*(x-x_0)^3 + b*(x-x_0) + c + W x + offset + periodic terms
+    hopf elements are stored in cusp form, see element_form. Linear 
+    couplings form W (shifted linear couplings strength*(x_from - shift) 
+    add the constant -strength*shift), stored in CSR format with row index = to_id and column
+    index = from_id. The sparsity pattern is fixed on construction, couplings
+    of strength zero are kept as explicit entries.
+    All other couplings (periodic projections of hopf elements and
+    couplings into hopf elements) are evaluated as grouped array operations
+    on their edges, see coupling_form. cos and sin are evaluated once per 
+    distinct frequency and time point.
+
+    Ensembles of networks with the same topology are evaluated on states of
+    shape (members, nodes). Element parameters may then be given per member
+    as arrays of shape (members, nodes) and coupling strengths as arrays of
+    shape (members, edges).
+    """
+
+    def __init__(self, a, b, c, x_0, from_id, to_id, strength, offset=None,
+                 projection=None, frequency=None, gain=None, shift=None,
+                 hopf=None):
+        """Constructor"""
+        self._a = np.array(a, dtype=float)
+        self._b = np.array(b, dtype=float)
+        self._c = np.array(c, dtype=float)
+        self._x_0 = np.array(x_0, dtype=float)
+        n = self._a.size
+        self._n = n
+        if offset is None:
+            self._offset = np.zeros(n)
+        else:
+            self._offset = np.array(offset, dtype=float)
+        if hopf is None:
+            self._hopf = np.zeros(n, dtype=bool)
+        else:
+            self._hopf = np.array(hopf, dtype=bool)
+
+        from_id = np.asarray(from_id, dtype=np.intp)
+        to_id = np.asarray(to_id, dtype=np.intp)
+        strength = np.asarray(strength, dtype=float)
+        m = from_id.size
+        projection = np.zeros(m, dtype=np.intp) if projection is None \
+                     else np.asarray(projection, dtype=np.intp)
+        frequency = np.zeros(m) if frequency is None \
+                    else np.asarray(frequency, dtype=float)
+        gain = np.zeros(m) if gain is None else np.asarray(gain, dtype=float)
+        self._shift = np.zeros(m) if shift is None \
+                      else np.asarray(shift, dtype=float)
+
+        # linear edges, sorted row-wise, edge_pos maps the linear edge 
+        # number -> position in data
+        self._linear = np.flatnonzero((projection == CONSTANT) & (gain == 0))
+        lin_from, lin_to = from_id[self._linear], to_id[self._linear]
+        order = np.lexsort((lin_from, lin_to))
+        self._edge_pos = np.empty(order.size, dtype=np.intp)
+        self._edge_pos[order] = np.arange(order.size)
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(lin_to, minlength=n), out=indptr[1:])
+        self._cpl = csr_matrix((strength[self._linear][order],
+                                lin_from[order], indptr), shape=(n, n))
+
+        # periodic and bilinear edges
+        self._other = np.flatnonzero((projection != CONSTANT) | (gain != 0))
+        self._other_strength = strength[self._other]
+        self._freqs, self._freq_id = np.unique(frequency[self._other],
+                                               return_inverse=True)
+        self._freq_id = self._freq_id.ravel()
+        self._projection_id = projection[self._other]
+        self._gain = gain[self._other]
+        self._bilinear = self._gain != 0
+        self._proj_t = None
+        self._proj = None
+
+        self._from_id = from_id
+        self._to_id = to_id
+        self._incidence = csr_matrix(
+            (np.ones(m), (to_id, np.arange(m))), shape=(n, m))
+        self._other_incidence = self._incidence[:, self._other]
+        self._member_strength = None
+        self._update_shift()
+        self._jac_pattern = {}
+
+    @classmethod
+    def from_network(cls, net):
+        """Pack the elements and couplings of a tipping_network.
+        Raises ValueError for element or coupling types which have no
+        array representation."""
+        n = net.number_of_nodes()
+        par = np.zeros((4, n))
+        hopf = np.zeros(n, dtype=bool)
+        for ind, data in net.nodes(data='data'):
+            par[:, ind] = element_form(data.get_type(), data.get_par())
+            hopf[ind] = data.get_type() == 'hopf'
+
+        m = net.number_of_edges()
+        from_id = np.zeros(m, dtype=np.intp)
+        to_id = np.zeros(m, dtype=np.intp)
+        form = np.zeros((5, m))
+        for ind, (u, v, data) in enumerate(net.edges(data='data')):
+            from_id[ind] = u
+            to_id[ind] = v
+            form[:, ind] = coupling_form(data)
+
+        return cls(par[0], par[1], par[2], par[3], from_id, to_id, form[0],
+                   projection=form[1], frequency=form[2], gain=form[3],
+                   shift=form[4], hopf=hopf)
+
+    def number_of_nodes(self):
+        return self._n
+
+    def get_par(self, key):
+        """Returns the parameter array for key ('a', 'b', 'c' or 'x_0')"""
+        return getattr(self, '_' + key)
+
+    def set_par(self, key, values):
+        """Replace the parameter array for key, values of shape (nodes,) or
+        (members, nodes)"""
+        values = np.array(values, dtype=float)
+        if values.shape[-1] != self._n:
+            raise ValueError("Last dimension of " + key + " must be the "
+                             "number of nodes.")
+        setattr(self, '_' + key, values)
+
+    def set_element_par(self, node_id, par, element_type='cusp'):
+        """Update the parameters of one element from its parameter dict"""
+        form = element_form(element_type, par)
+        for key, val in zip(('a', 'b', 'c', 'x_0'), form):
+            self.get_par(key)[..., node_id] = val
+
+    def get_tip_states(self, x):
+        """x > x_0 for cusp elements, c > 0 for hopf elements"""
+        tipped = np.asarray(x) > self._x_0
+        if self._hopf.any():
+            tipped = np.array(np.broadcast_to(tipped, np.broadcast_shapes(
+                tipped.shape, self._b.shape)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                c_hopf = -self._b / self._a
+            tipped[..., self._hopf] = np.broadcast_to(
+                c_hopf > 0, tipped.shape)[..., self._hopf]
+        return tipped
+
+    def get_tip_thresholds(self):
+        """Returns the thresholds x_0 (nan for hopf elements)"""
+        return np.where(self._hopf, np.nan, self._x_0)
+
+    def get_strength(self):
+        """Returns the coupling strengths in edge order"""
+        if self._member_strength is not None:
+            return self._member_strength
+        strength = np.empty(self._from_id.size)
+        strength[self._linear] = self._cpl.data[self._edge_pos]
+        strength[self._other] = self._other_strength
+        return strength
+
+    def set_strength(self, strength):
+        """Overwrite the coupling strengths (edge order as on construction).
+        Strengths of shape (edges,) are written into the coupling matrix in
+        place, strengths of shape (members, edges) are kept per member."""
+        strength = np.asarray(strength, dtype=float)
+        if strength.ndim == 2:
+            self._member_strength = strength
+        else:
+            self._member_strength = None
+            self._cpl.data[self._edge_pos] = strength[self._linear]
+            self._other_strength = strength[self._other]
+        self._update_shift()
+
+    def _update_shift(self):
+        """Constant coupling terms -strength*shift summed at the targets"""
+        if not self._shift.any():
+            self._shift_term = 0.
+            return
+        flow = self.get_strength() * self._shift
+        self._shift_term = -(self._incidence @ flow.T).T
+
+    def _projection(self, t):
+        """cos or sin projections (1 for constant couplings) of the 
+        periodic and bilinear edges at time t"""
+        if t != self._proj_t:
+            phase = self._freqs * t
+            trig = np.stack((np.ones_like(phase), np.cos(phase),
+                             np.sin(phase)))
+            self._proj = trig[self._projection_id, self._freq_id]
+            self._proj_t = t
+        return self._proj
+
+    def _other_weights(self, x, t, strength):
+        """Jacobian entries d f_to / d x_from of the periodic and bilinear
+        edges and their contributions d f_to / d x_to"""
+        weight = strength * self._projection(t)
+        x_to = x[..., self._to_id[self._other]]
+        x_from = x[..., self._from_id[self._other]]
+        return (np.where(self._bilinear, weight * self._gain * x_to, weight),
+                np.where(self._bilinear, weight * self._gain * x_from, 0.))
+
+    def _edge_weights(self, x, t):
+        """Jacobian entries d f_to / d x_from in edge order and the diagonal
+        contributions of the couplings"""
+        strength = self.get_strength()
+        if self._other.size == 0:
+            return strength, 0.
+        shape = np.broadcast_shapes(strength.shape[:-1], x.shape[:-1])
+        weights = np.empty(shape + strength.shape[-1:])
+        weights[...] = strength
+        weights[..., self._other], diag = self._other_weights(
+            x, t, strength[..., self._other])
+        return weights, (self._other_incidence @ diag.T).T
+
+    def _coupling(self, x, t):
+        if self._member_strength is None:
+            cpl = (self._cpl @ x.T).T
+            if self._other.size:
+                weight = self._other_weights(x, t, self._other_strength)[0]
+                flow = weight * x[..., self._from_id[self._other]]
+                cpl = cpl + (self._other_incidence @ flow.T).T
+            return cpl + self._shift_term
+        # edge flows are summed up at their target nodes by the incidence
+        # matrix (nodes x edges)
+        flow = self._edge_weights(x, t)[0] * x[..., self._from_id]
+        return (self._incidence @ flow.T).T + self._shift_term
+
+    def f(self, x, t):
+        x = np.asarray(x)
+        dx = x - self._x_0
+        return self._a * dx**3 + self._b * dx + self._c \
+               + self._coupling(x, t) + self._offset
+
+    def jac_diag(self, x, t):
+        """Diagonal of the jacobian of the elements"""
+        dx = np.asarray(x) - self._x_0
+        return 3 * self._a * dx**2 + self._b
+
+    def jac(self, x, t):
+        """Dense jacobian, of shape (members, nodes, nodes) for ensembles"""
+        x = np.asarray(x)
+        weights, cpl_diag = self._edge_weights(x, t)
+        diag = self.jac_diag(x, t) + cpl_diag
+        shape = np.broadcast_shapes(diag.shape[:-1], weights.shape[:-1])
+        jac = np.zeros(shape + (self._n, self._n))
+        jac[..., self._to_id, self._from_id] = weights
+        ind = np.arange(self._n)
+        jac[..., ind, ind] += diag
+        return jac
+
+    def jac_sparse(self, x, t):
+        """Sparse jacobian, block diagonal over the members for ensembles
+        (ordered as the flattened ensemble state)"""
+        x = np.asarray(x)
+        weights, cpl_diag = self._edge_weights(x, t)
+        diag = self.jac_diag(x, t) + cpl_diag
+        members = int(np.prod(np.broadcast_shapes(diag.shape[:-1],
+                                                  weights.shape[:-1])))
+        if members not in self._jac_pattern:
+            n = self._n
+            diag_id = np.arange(n)
+            shift = n * np.arange(members)[:, np.newaxis]
+            rows = np.concatenate((self._to_id, diag_id)) + shift
+            cols = np.concatenate((self._from_id, diag_id)) + shift
+            self._jac_pattern[members] = sparse_pattern(
+                members * n, rows.ravel(), cols.ravel())
+        vals = np.concatenate(
+            (np.broadcast_to(weights, (members, weights.shape[-1])),
+             np.broadcast_to(diag, (members, self._n))), axis=1)
+        return self._jac_pattern[members].fill(vals.ravel())
+
+
+class stacked_network:
+    """Ensemble of networks with identical topology as one stacked system.
+    The ensemble state of shape (members, nodes) is flattened for the
+    solvers, f, jac and jac_sparse act on the flat state."""
+
+    def __init__(self, net, shape):
+        """Constructor"""
+        self._net = net
+        self._shape = tuple(shape)
+
+    def number_of_nodes(self):
+        return int(np.prod(self._shape))
+
+    def f(self, x, t):
+        return self._net.f(np.reshape(x, self._shape), t).ravel()
+
+    def jac(self, x, t):
+        return block_diag(*self._net.jac(np.reshape(x, self._shape), t))
+
+    def jac_sparse(self, x, t):
+        return self._net.jac_sparse(np.reshape(x, self._shape), t)
+
+    def get_tip_thresholds(self):
+        return np.broadcast_to(self._net.get_tip_thresholds(),
+                               self._shape).ravel()
+
+    def get_tip_states(self, x):
+        return self._net.get_tip_states(np.reshape(x, self._shape))
@@ -0,0 +1,207 @@
+"""continuation module
+
+Provides numerical continuation of equilibria of a tipping_network in one
+parameter. Branches of equilibria are traced with pseudo-arclength
+continuation based on the f and jac of the network, fold points (where
+elements tip) are detected from sign changes of the jacobian determinant.
+This replaces sweeps of long time integrations over a parameter grid.
+
+Example, equilibria of a network in the c parameter of node 0:
+    def set_c(net, c):
+        net.set_param(0, 'c', c)
+    params, states, stable, folds = trace_branch(net, set_c, x0, 0., 1.)
+"""
+import numpy as np
+from scipy.sparse import bmat, csc_matrix, issparse
+from scipy.sparse.linalg import spsolve, splu
+from pycascades.core.evolve import jacobian_is_stable
+
+def _permutation_sign(perm):
+    """Sign of a permutation given as index array"""
+    perm = np.array(perm)
+    seen = np.zeros(perm.size, dtype=bool)
+    transpositions = 0
+    for start in range(perm.size):
+        length = 0
+        ind = start
+        while not seen[ind]:
+            seen[ind] = True
+            ind = perm[ind]
+            length += 1
+        if length:
+            transpositions += length - 1
+    return -1 if transpositions % 2 else 1
+
+def det_sign(jac):
+    """Sign of the determinant of a dense or sparse jacobian"""
+    if not issparse(jac):
+        return np.linalg.slogdet(jac)[0]
+    try:
+        lu = splu(csc_matrix(jac))
+    except RuntimeError:
+        # exactly singular
+        return 0.
+    return np.prod(np.sign(lu.U.diagonal())) \
+           * _permutation_sign(lu.perm_r) * _permutation_sign(lu.perm_c)
+
+class _system:
+    """f, jac and df/dp of a network as functions of state and parameter"""
+
+    def __init__(self, net, set_parameter, sparse, dp):
+        self._net = net
+        self._set_parameter = set_parameter
+        self._sparse = sparse
+        self._dp = dp
+
+    def f(self, x, p):
+        self._set_parameter(self._net, p)
+        return self._net.f(x, 0)
+
+    def jac(self, x, p):
+        self._set_parameter(self._net, p)
+        if self._sparse:
+            return self._net.jac_sparse(x, 0).copy()
+        return self._net.jac(x, 0)
+
+    def is_stable(self, x, p):
+        self._set_parameter(self._net, p)
+        return jacobian_is_stable(self._net, x, 0, self._sparse)
+
+    def f_p(self, x, p):
+        """central difference of f in the parameter"""
+        h = self._dp * max(1., abs(p))
+        return (self.f(x, p + h) - self.f(x, p - h)) / (2 * h)
+
+    def solve_bordered(self, jac, f_p, tangent, rhs):
+        """solve [[jac, f_p], [tangent]] z = rhs"""
+        if self._sparse:
+            mat = bmat([[jac, csc_matrix(f_p[:, np.newaxis])],
+                        [csc_matrix(tangent[np.newaxis, :-1]),
+                         csc_matrix(tangent[np.newaxis, -1:])]],
+                       format='csc')
+            return spsolve(mat, rhs)
+        mat = np.block([[jac, f_p[:, np.newaxis]], [tangent[np.newaxis, :]]])
+        return np.linalg.solve(mat, rhs)
+
+def _newton(system, x, p, tol, max_iter):
+    """Newton correction of x at fixed parameter p"""
+    for i in range(max_iter):
+        f = system.f(x, p)
+        if np.max(np.abs(f)) < tol:
+            return x, True
+        jac = system.jac(x, p)
+        if issparse(jac):
+            x = x - spsolve(csc_matrix(jac), f)
+        else:
+            x = x - np.linalg.solve(jac, f)
+    return x, np.max(np.abs(system.f(x, p))) < tol
+
+def _correct(system, x, p, tangent, ds, tol, max_iter):
+    """Pseudo-arclength predictor step of length ds along the tangent and 
+    Newton corrector. Returns the corrected point (state, parameter) or None
+    and the number of Newton iterations"""
+    y_pred = np.append(x, p) + ds * tangent
+    y = y_pred.copy()
+    for i in range(max_iter):
+        f = system.f(y[:-1], y[-1])
+        residual = np.append(f, tangent @ (y - y_pred))
+        if np.max(np.abs(residual)) < tol:
+            return y, i
+        y -= system.solve_bordered(system.jac(y[:-1], y[-1]),
+                                   system.f_p(y[:-1], y[-1]),
+                                   tangent, residual)
+    return None, max_iter
+
+def _tangent(system, jac, x, p, tangent):
+    """Normalized tangent of the branch at (x, p), oriented as tangent"""
+    rhs = np.zeros(x.size + 1)
+    rhs[-1] = 1.
+    tangent = system.solve_bordered(jac, system.f_p(x, p), tangent, rhs)
+    return tangent / np.linalg.norm(tangent)
+
+def trace_branch(tipping_network, set_parameter, x0, p0, p_end, ds=0.01,
+                 ds_min=1e-6, ds_max=0.1, tol=1e-9, max_steps=10000,
+                 max_newton=10, stop_at_fold=True, sparse=None, dp=1e-6,
+                 p_bounds=None):
+    """Trace the branch of equilibria through the state x0 (an equilibrium
+    or a state close to it) at parameter p0 towards p_end with
+    pseudo-arclength continuation. set_parameter(tipping_network, p) has to
+    set the continuation parameter on the network. The step length ds is
+    adapted between ds_min and ds_max. With stop_at_fold the tracing stops
+    at the first fold point, otherwise it stops when p_end is passed or the
+    parameter leaves p_bounds (default: the interval from p0 to p_end 
+    extended by its length on both sides). sparse selects the sparse 
+    jacobian (default: for networks with more than 500 nodes).
+    Returns the parameters and states along the branch, the stability of
+    the states and a list of fold points (parameter, state). The stability
+    is computed from the eigenvalues of the jacobian at the initial state 
+    and after every sign change of the jacobian determinant. The 
+    parameter of the network is reset to p0 afterwards."""
+    if sparse is None:
+        sparse = tipping_network.number_of_nodes() > 500
+    system = _system(tipping_network, set_parameter, sparse, dp)
+    direction = np.sign(p_end - p0)
+    if p_bounds is None:
+        width = abs(p_end - p0)
+        p_bounds = (min(p0, p_end) - width, max(p0, p_end) + width)
+
+    x, converged = _newton(system, np.array(x0, dtype=float), p0, tol,
+                           max_newton)
+    if not converged:
+        raise ValueError("Initial state could not be corrected to an "
+                         "equilibrium.")
+    p = float(p0)
+    n = x.size
+    jac = system.jac(x, p)
+    stable = system.is_stable(x, p)
+    sign = det_sign(jac)
+
+    # initial tangent: jac dx/dp = -f_p, oriented towards p_end
+    e_p = np.zeros(n + 1)
+    e_p[-1] = direction
+    tangent = _tangent(system, jac, x, p, e_p)
+
+    params, states, stability, folds = [p], [x], [stable], []
+    for step in range(max_steps):
+        if direction * (p_end - p) <= 0 or ds < ds_min \
+           or not p_bounds[0] <= p <= p_bounds[1]:
+            break
+        y, iterations = _correct(system, x, p, tangent, ds, tol, max_newton)
+        if y is None:
+            ds /= 2
+            continue
+
+        x_new, p_new = y[:-1], y[-1]
+        jac = system.jac(x_new, p_new)
+        sign_new = det_sign(jac)
+        if sign_new != sign:
+            # bisection of the step length for the fold point
+            lo, hi = 0., ds
+            fold = y
+            while hi - lo > ds_min:
+                mid = (lo + hi) / 2
+                y_mid = _correct(system, x, p, tangent, mid, tol,
+                                 max_newton)[0]
+                if y_mid is None:
+                    break
+                fold = y_mid
+                if det_sign(system.jac(y_mid[:-1], y_mid[-1])) == sign:
+                    lo = mid
+                else:
+                    hi = mid
+            folds.append((fold[-1], fold[:-1]))
+            stable = system.is_stable(x_new, p_new)
+        sign = sign_new
+
+        tangent = _tangent(system, jac, x_new, p_new, tangent)
+        x, p = x_new, p_new
+        params.append(p)
+        states.append(x)
+        stability.append(stable)
+        if folds and stop_at_fold:
+            break
+        if iterations < 4:
+            ds = min(1.3 * ds, ds_max)
+
+    set_parameter(tipping_network, p0)
+    return np.array(params), np.array(states), np.array(stability), folds
@@ -13,7 +13,10 @@ class coupling:
     classes."""
 
     def __init__(self):
-        pass
+        self._type = None
+
+    def get_type(self):
+        return self._type
 
     def dxdt_cpl(self):
         """Returns callable for the coupling term of dxdt."""
@@ -29,6 +32,10 @@ class coupling:
     def projection(self):
         return lambda t : 1
 
+    def set_strength(self, strength):
+        """Set the coupling strength, the callables use the new value"""
+        self._strength = strength
+
 
 class linear_coupling(coupling):
     """Class for linear coupling
@@ -38,8 +45,9 @@ class linear_coupling(coupling):
     def __init__(self, strength):
         """Constructor"""
         coupling.__init__(self)
+        self._type = 'linear'
         self._strength = strength
-        
+
     def dxdt_cpl(self):
         """Returns callable for the coupling term of dxdt."""
         return lambda t, x_from , x_to : self._strength * x_from
@@ -60,7 +68,8 @@ class cusp_to_hopf(coupling):
     """Class for coupling """
 
     def __init__(self, _from, _to, a_hopf, strength):
-        coupling.__init__(self, _from, _to)
+        coupling.__init__(self)
+        self._type = 'cusp_to_hopf'
         self._strength = strength
         self._a = a_hopf
 
@@ -85,7 +94,8 @@ class hopf_x_to_cusp(coupling):
 
     def __init__(self, _from, _to, b_hopf, strength):
         """Constructor"""
-        coupling.__init__(self, _from, _to)
+        coupling.__init__(self)
+        self._type = 'hopf_x_to_cusp'
         self._b = b_hopf
         self._strength = strength
 
@@ -114,6 +124,8 @@ class hopf_y_to_cusp(coupling):
 
     def __init__(self, _from, _to, b_hopf, strength):
         """Constructor"""
+        coupling.__init__(self)
+        self._type = 'hopf_y_to_cusp'
         self._b = b_hopf
         self._strength = strength
 
@@ -140,7 +152,8 @@ class hopf_y_to_cusp(coupling):
 class hopf_x_to_hopf(coupling):
     """Class for coupling """
     def __init__(self, _from, _to, a_to, b_from, strength):
-        coupling.__init__(self, _from, _to)
+        coupling.__init__(self)
+        self._type = 'hopf_x_to_hopf'
         self._a_to = a_to
         self._b_from = b_from
         self._strength = strength
@@ -168,7 +181,8 @@ class hopf_y_to_hopf(coupling):
     """Class for coupling """
 
     def __init__(self, _from, _to, a_to, b_from, strength):
-        coupling.__init__(self, _from, _to)
+        coupling.__init__(self)
+        self._type = 'hopf_y_to_hopf'
         self._a_to = a_to
         self._b_from = b_from
         self._strength = strength
@@ -1,84 +1,438 @@
-from scipy.integrate import odeint
+from scipy.integrate import odeint, solve_ivp
+from scipy.sparse import csc_matrix, identity
+from scipy.sparse.linalg import spsolve, splu, eigs, LinearOperator, \
+                                ArpackNoConvergence
 import numpy as np
 import time
+from pycascades.core.compiled import stacked_network
+from pycascades.core.trajectory import trajectory
 
 """evolve module"""
 class NoEquilibrium(Exception):
     pass
 
+class IntegrationError(Exception):
+    pass
+
+# solve_ivp methods using the (sparse) jacobian of the network
+JAC_METHODS = ['LSODA', 'BDF', 'Radau']
+SPARSE_JAC_METHODS = ['BDF', 'Radau']
+
+# number of output steps integrated per solver call in event mode
+EVENT_CHUNK = 1000
+
+# default relative and absolute tolerance of the solvers (odeint's default)
+ODEINT_TOL = 1.49012e-8
+
+# networks up to this size use dense eigenvalues in the stability check
+DENSE_STABILITY_LIMIT = 500
+
+def output_times( t_start, t_step, t_end ):
+    """Times reached by stepping with t_step from t_start until t_end is 
+    reached (same floating point values as a loop adding up t_step)."""
+    if t_start >= t_end:
+        return np.array( [t_start] )
+    n = int( np.ceil( (t_end - t_start) / t_step ) ) + 2
+    steps = np.full( n + 1, float(t_step) )
+    steps[0] = t_start
+    times = np.cumsum( steps )
+    return times[: np.argmax( times >= t_end ) + 1]
+
+def jacobian_is_stable( net, x, t, sparse=None, k=6 ):
+    """Check if all eigenvalues of the jacobian of net at (x, t) have 
+    negative real part. Small networks (or sparse=False) use the dense 
+    eigenvalues. Otherwise the Gershgorin discs of the sparse jacobian are 
+    checked first, if they do not lie in the left half plane the k 
+    eigenvalues of largest modulus of the Cayley transform 
+    (J - sigma I)^-1 (J + sigma I) are computed by ARPACK. The transform 
+    maps the left half plane into the unit disc and the right half plane 
+    out of it, so an unstable eigenvalue is found whatever its imaginary 
+    part. The dense eigenvalues are used if ARPACK does not converge."""
+    n = np.size( x )
+    if sparse is None:
+        sparse = hasattr( net, 'jac_sparse' ) and n > DENSE_STABILITY_LIMIT
+    if not sparse or n < k + 2:
+        return bool( np.all( np.linalg.eigvals( net.jac( x, t ) ).real < 0 ) )
+
+    jacobian = csc_matrix( net.jac_sparse( x, t ) )
+    diag = jacobian.diagonal()
+    abs_jac = abs( jacobian )
+    off_rows = np.asarray( abs_jac.sum( axis=1 ) ).ravel() - np.abs( diag )
+    off_cols = np.asarray( abs_jac.sum( axis=0 ) ).ravel() - np.abs( diag )
+    bound = min( np.max( diag + off_rows ), np.max( diag + off_cols ) )
+    if bound < 0:
+        return True
+
+    # sigma right of the discs (J - sigma I is regular) and of the order of 
+    # the diagonal, the stable eigenvalues are mapped well inside the disc
+    sigma = max( bound, np.max( np.abs( diag ) ), 1. ) * 1.01
+    lu = splu( csc_matrix( jacobian - sigma * identity( n ) ),
+               permc_spec='MMD_AT_PLUS_A' )
+    cayley = LinearOperator( (n, n), dtype=float,
+                             matvec=lambda v: lu.solve( jacobian @ v
+                                                        + sigma * v ) )
+    try:
+        mu = eigs( cayley, k=k, which='LM', tol=1e-6,
+                   return_eigenvectors=False )
+    except ArpackNoConvergence:
+        return bool( np.all( np.linalg.eigvals( jacobian.toarray() ).real < 0 ) )
+    # |mu| < 1 <=> Re(lambda) < 0 for lambda = sigma (mu + 1) / (mu - 1)
+    return bool( np.all( np.abs( mu ) < 1 ) )
+
 class evolve():
-    def __init__( self, tipping_network, initial_state ):
-        # Initialize solver
+    def __init__( self, tipping_network, initial_state, save_every=1,
+                  max_length=None ):
+        """save_every and max_length configure the trajectory storage:
+        only every save_every-th state is saved and only the last 
+        max_length states are kept (max_length=1: final state only).
+        An initial_state of shape (members, nodes) evolves an ensemble of 
+        the (compiled) network, see tipping_network.set_ensemble_par."""
+        # Initialize solver, ensemble states (members x nodes) are 
+        # integrated as one stacked system
+        self._shape = np.shape( initial_state )
+        if len( self._shape ) == 2:
+            tipping_network = stacked_network( tipping_network, self._shape )
+            initial_state = np.ravel( initial_state )
         self._net = tipping_network
         # Initialize state
-        self._times = []
-        self._states = []
+        self._trajectory = trajectory( save_every, max_length )
         
         self._t = 0
         self._x = initial_state
+        self._events = {}
+        self._stop_reason = None
+        self._tip_states = None
+        self._last_change = None
+        self._observers = []
         
         self.save_state( self._t, self._x ) 
         
     def save_state( self , t, x):
         """Save current state if save flag is set"""
-        self._times.append( t )
-        self._states.append( x )
+        self._trajectory.append( t, x )
+        if self._observers:
+            times = np.array( [t] )
+            states = np.asarray( x, dtype=float )[np.newaxis]
+            for observer in self._observers:
+                observer.update( times, states )
+
+    def _store( self, times, states ):
+        """Pass states (first axis is time) to the trajectory storage and 
+        the observers"""
+        self._trajectory.extend( times, states )
+        if self._observers:
+            for observer in self._observers:
+                observer.update( times, states )
+
+    def add_observer( self, observer ):
+        """Register an observer (see the observers module), it is called as
+        observer.update( times, states ) with every computed state, 
+        starting with the current one, independent of save_every and 
+        max_length"""
+        self._observers.append( observer )
+        observer.update( np.array( [self._t] ),
+                         np.asarray( self._x, dtype=float )[np.newaxis] )
     
     def get_timeseries( self ):
-        times = np.array ( self._times )
-        states = np.array ( self._states )
-        return times , states
+        """Returns views of the saved times and states"""
+        times, states = self._trajectory.get()
+        return times, states.reshape( (-1,) + self._shape )
         
-    def _integrate( self, t_step ):
+    def _solve_ivp( self, t_span, method, t_eval=None, rtol=ODEINT_TOL,
+                    atol=ODEINT_TOL, **kwargs ):
+        """Integrate with scipy's solve_ivp. Stiff solvers get the jacobian 
+        of the network, BDF and Radau the sparse one (if provided by the 
+        network)."""
+        fun = lambda t, x : self._net.f( x, t )
+        if method in SPARSE_JAC_METHODS and hasattr( self._net, 'jac_sparse' ):
+            kwargs['jac'] = lambda t, x : self._net.jac_sparse( x, t )
+        elif method in JAC_METHODS:
+            kwargs['jac'] = lambda t, x : self._net.jac( x, t )
+        x_init = np.asarray( self._x, dtype=float )
+        sol = solve_ivp( fun, t_span, x_init, method=method, t_eval=t_eval,
+                         rtol=rtol, atol=atol, **kwargs )
+        if sol.status == -1:
+            raise IntegrationError( sol.message )
+        return sol
+
+    def _integrate( self, t_step, method=None, rtol=ODEINT_TOL,
+                    atol=ODEINT_TOL ):
         
         t_span = [ self._t , self._t + t_step ]
         x_init = self._x
-        sol = odeint( self._net.f , x_init, t_span, Dfun=self._net.jac )
+        if method is None:
+            sol = odeint( self._net.f , x_init, t_span, Dfun=self._net.jac,
+                          rtol=rtol, atol=atol )
+            self._x = sol[1]
+        else:
+            sol = self._solve_ivp( t_span, method, rtol=rtol, atol=atol )
+            self._x = sol.y[:, -1]
         self._t = t_span[1]
-        self._x = sol[1]
         self.save_state(self._t, self._x)
         
-    def integrate( self, t_step, t_end ):
-        """Manually integrate to t_end"""
-        while self._times[-1] < t_end:
-            self._integrate( t_step )
-    
-    def equilibrate( self, tol , t_step, t_break=None ):
+    def _integrate_grid( self, times, method=None, rtol=ODEINT_TOL,
+                         atol=ODEINT_TOL ):
+        """Integrate over all times with one solver call and save the 
+        states at times[1:]"""
+        if method is None:
+            sol = odeint( self._net.f, self._x, times, Dfun=self._net.jac,
+                          rtol=rtol, atol=atol )[1:]
+        else:
+            sol = self._solve_ivp( [times[0], times[-1]], method,
+                                   t_eval=times[1:], rtol=rtol,
+                                   atol=atol ).y.T
+        self._store( times[1:], sol )
+        self._t = times[-1]
+        self._x = sol[-1]
+
+    def integrate( self, t_step, t_end, method=None, single_call=False,
+                   stop_window=None, margin=0.1, rtol=ODEINT_TOL,
+                   atol=ODEINT_TOL ):
+        """Manually integrate to t_end. By default every step is computed 
+        with odeint, method selects a solve_ivp method instead 
+        (e.g. 'BDF' or 'Radau' with sparse jacobian for large networks).
+        rtol and atol are the relative and absolute tolerances of the 
+        solver (default: odeint's default for all methods).
+        With single_call the whole horizon is integrated by one solver call
+        which keeps its step size history and returns the states on the
+        same output grid of t_step.
+        With stop_window the integration stops before t_end when the 
+        cascade is complete: the tip states did not change for a time of
+        stop_window and all elements are contracting (see is_contracting).
+        In single_call mode the horizon is integrated in chunks of 
+        stop_window and this is checked after every chunk. The reason of 
+        the stop is available from get_stop_reason."""
+        self._stop_reason = 't_end'
+        if stop_window is not None:
+            self._tip_states = self._tip_vector( self._x )
+            self._last_change = self._t
+        if single_call:
+            times = output_times( self._t, t_step, t_end )
+            chunk = times.size
+            if stop_window is not None:
+                chunk = max( int( np.ceil( stop_window / t_step ) ), 1 )
+            for start in range( 0, times.size - 1, chunk ):
+                self._integrate_grid( times[start:start + chunk + 1], method,
+                                      rtol, atol )
+                if stop_window is not None and self._is_complete(
+                        stop_window, margin ):
+                    return
+            return
+        while self._t < t_end:
+            self._integrate( t_step, method, rtol, atol )
+            if stop_window is not None and self._is_complete(
+                    stop_window, margin ):
+                return
+
+    def _tip_vector( self, x ):
+        return np.ravel( self._net.get_tip_states( x ) )
+
+    def _is_complete( self, stop_window, margin ):
+        """Update the time of the last tip state change with the current 
+        state and check the completion of the cascade"""
+        tip_states = self._tip_vector( self._x )
+        if np.any( tip_states != self._tip_states ):
+            self._tip_states = tip_states
+            self._last_change = self._t
+            return False
+        if self._t - self._last_change >= stop_window \
+           and self.is_contracting( margin ):
+            self._stop_reason = 'cascade_complete'
+            return True
+        return False
+
+    def get_stop_reason( self ):
+        """Returns why the last integrate or equilibrate call stopped: 
+        't_end', 'cascade_complete', 'equilibrium' or the name of the 
+        solver event (see get_events)"""
+        return self._stop_reason
+
+    def equilibrate( self, tol , t_step, t_break=None, method=None,
+                     events=False, stop_on_tip=False, rtol=None, atol=None ):
         """Iterate system until it is in equilibrium. 
         After every iteration it is checked if the system is in a stable
-        equilibrium"""
+        equilibrium. rtol and atol are the solver tolerances, see 
+        integrate (default: odeint's default, with events 1e-3 * tol).
+        With events the check is done by terminal solver events of an 
+        adaptive solve_ivp integration (method, default 'LSODA') instead,
+        states are saved on the t_step grid. With stop_on_tip the 
+        integration also stops as soon as any element crosses its tipping 
+        threshold. The time and state of the events are available from 
+        get_events. t_break is checked after every EVENT_CHUNK steps."""
+        if events:
+            return self._equilibrate_events( tol, t_step, t_break,
+                                             method or 'LSODA', stop_on_tip,
+                                             rtol, atol )
+        if rtol is None:
+            rtol = ODEINT_TOL
+        if atol is None:
+            atol = ODEINT_TOL
         t0 = time.process_time()
         while not self.is_equilibrium( tol ): 
-            self._integrate( t_step )
+            self._integrate( t_step, method, rtol, atol )
+            if t_break and (time.process_time() - t0) >= t_break:
+                raise NoEquilibrium(
+                        "No equilibrium found " \
+                        "in " + str(t_break) + " seconds." \
+                        " Increase tolerance or breaktime."
+                        )
+        self._stop_reason = 'equilibrium'
+
+    def _equilibrate_events( self, tol, t_step, t_break, method, 
+                             stop_on_tip, rtol, atol ):
+        self._events = {}
+        if self.is_equilibrium( tol ):
+            self._events['equilibrium'] = ( self._t, np.array( self._x ) )
+            self._stop_reason = 'equilibrium'
+            return
+        # the event time is accurate to about atol / tol of the relaxation
+        # time of the state
+        if rtol is None:
+            rtol = 1e-3 * tol
+        if atol is None:
+            atol = 1e-3 * tol
+        
+        # the root lies slightly below tol, the event state satisfies 
+        # is_equilibrium( tol )
+        event_tol = ( 1 - 1e-6 ) * tol
+        def equilibrium( t, x ):
+            return np.max( np.abs( self._net.f( x, t ) ) ) - event_tol
+        equilibrium.terminal = True
+        equilibrium.direction = -1
+        event_list = [equilibrium]
+        
+        if stop_on_tip:
+            threshold = self._net.get_tip_thresholds()
+            valid = np.isfinite( threshold )
+            threshold = threshold[valid]
+            side = np.where( np.asarray( self._x )[valid] > threshold, 1, -1 )
+            def tipping( t, x ):
+                return np.min( side * ( x[valid] - threshold ) )
+            tipping.terminal = True
+            tipping.direction = -1
+            event_list.append( tipping )
+
+        names = [event.__name__ for event in event_list]
+        
+        t0 = time.process_time()
+        while True:
+            times = output_times( self._t, t_step,
+                                  self._t + EVENT_CHUNK * t_step )
+            sol = self._solve_ivp( [times[0], times[-1]], method,
+                                   t_eval=times[1:], events=event_list,
+                                   rtol=rtol, atol=atol )
+            self._store( sol.t, sol.y.T )
+            if sol.status == 1:
+                break
+            self._t, self._x = times[-1], sol.y[:, -1]
             if t_break and (time.process_time() - t0) >= t_break:
                 raise NoEquilibrium(
                         "No equilibrium found " \
                         "in " + str(t_break) + " seconds." \
                         " Increase tolerance or breaktime."
                         )
+        
+        for name, t_ev, x_ev in zip( names, sol.t_events, sol.y_events ):
+            if t_ev.size:
+                self._events[name] = ( t_ev[0], x_ev[0] )
+        name = min( self._events, key=lambda key : self._events[key][0] )
+        self._t, self._x = self._events[name]
+        self._stop_reason = name
+        self.save_state( self._t, self._x )
+
+    def get_events( self ):
+        """Returns a dict of the events of the last event based 
+        equilibration, mapping the event name ('equilibrium', 'tipping')
+        to its time and state"""
+        return self._events
    
+    def solve_steady_state( self, tol, t_step=1, dt=None, max_iter=1000,
+                            t_break=None ):
+        """Find the stable equilibrium reached from the current state by 
+        pseudo-transient continuation: damped Newton steps 
+        (I/dt - jac) dx = f with the analytic (sparse) jacobian. The pseudo
+        time step dt (default t_step) grows as the residual decreases until
+        the iteration is a pure Newton iteration, while elements are in 
+        transition it stays at its initial value (implicit Euler steps).
+        If the iteration does not converge to a stable state (Newton left 
+        the basin of attraction), the system is equilibrated by time 
+        stepping with t_step instead.
+        Returns True if the steady state was found without time stepping.
+        The steady state is saved at the current time."""
+        x = np.array( self._x, dtype=float )
+        x_init = x.copy()
+        n = x.size
+        sparse = hasattr( self._net, 'jac_sparse' )
+        if dt is None:
+            dt = t_step
+        dt_min = dt
+        f = self._net.f( x, self._t )
+        res = np.linalg.norm( f )
+        for k in range( max_iter ):
+            if np.max( np.abs( f ) ) < tol:
+                break
+            if sparse:
+                jac = self._net.jac_sparse( x, self._t )
+                dx = spsolve( csc_matrix( identity( n ) / dt - jac ), f )
+            else:
+                jac = self._net.jac( x, self._t )
+                dx = np.linalg.solve( np.eye( n ) / dt - jac, f )
+            x_new = x + dx
+            f_new = self._net.f( x_new, self._t )
+            res_new = np.linalg.norm( f_new )
+            if not np.isfinite( res_new ) or res_new > 2 * res:
+                # damping: reduce the pseudo time step
+                dt /= 4
+                continue
+            # switched evolution relaxation
+            dt = min( max( dt * res / max( res_new, tol * 1e-6 ), dt_min ),
+                      1e12 )
+            x, f, res = x_new, f_new, res_new
+
+        if np.max( np.abs( f ) ) < tol:
+            self._x = x
+            if self.is_stable():
+                self.save_state( self._t, self._x )
+                return True
+        self._x = x_init
+        self.equilibrate( tol, t_step, t_break )
+        return False
+
     def is_equilibrium( self, tol ):
         """Check if the system is in an equilibrium state, e.g. if the 
         absolute value of all elements of f_prime is less than tolerance. 
         If True the state can be considered as close to a fixed point"""
-        n = self._net.number_of_nodes()
         f = self._net.f( self._x, self._t)
-        fix = np.less( np.abs( f) , tol * np.ones( n ))
-        
-        if fix.all():
-            return True
-        else:
-            return False
+        return bool( np.all( np.abs( f ) < tol ) )
 
-    def is_stable( self ):
-        """Check stability of current system state by calculating the 
-        eigenvalues of the jacobian (all eigenvalues < 0 => stable)."""
-        n = self._net.number_of_nodes()
-        jacobian = self._net.jac( self._x, self._t)
-        val, vec = np.linalg.eig( jacobian )
-        stable = np.less( val, np.zeros( n ) )
+    def _jac( self, x ):
+        if hasattr( self._net, 'jac_sparse' ):
+            return self._net.jac_sparse( x, self._t )
+        return self._net.jac( x, self._t )
 
-        if stable.all():
-            return True
-        else:
+    def is_contracting( self, margin ):
+        """Check if all elements are contracting: the diagonal of the 
+        jacobian is negative and, for elements with tipping threshold x_0, 
+        the state keeps a distance larger than margin from the threshold and
+        is restored from there, i.e. f of the element points away from the 
+        threshold when it is moved by margin towards it (the other elements
+        are kept fixed to first order)"""
+        x = np.asarray( self._x, dtype=float )
+        threshold = self._net.get_tip_thresholds()
+        valid = np.isfinite( threshold )
+        side = np.sign( x[valid] - threshold[valid] )
+        if not ( np.all( self._jac( x ).diagonal() < 0 ) and 
+                 np.all( side * ( x[valid] - threshold[valid] ) > margin ) ):
             return False
+        delta = np.zeros( x.size )
+        delta[valid] = -side * margin
+        jacobian = self._jac( x + delta )
+        f = self._net.f( x + delta, self._t ) - jacobian @ delta \
+            + jacobian.diagonal() * delta
+        return bool( np.all( side * f[valid] > 0 ) )
+
+    def is_stable( self, sparse=None ):
+        """Check stability of current system state by calculating the 
+        eigenvalues of the jacobian (all real parts < 0 => stable), see 
+        jacobian_is_stable."""
+        return jacobian_is_stable( self._net, self._x, self._t, sparse )
@@ -3,6 +3,9 @@ import numpy as np
 import time
 import sdeint
 from scipy.stats import levy, cauchy
+from pycascades.core.compiled import stacked_network
+from pycascades.core.evolve import output_times, jacobian_is_stable
+from pycascades.core.trajectory import trajectory
 
 """evolve module"""
 class NoEquilibrium(Exception):
@@ -42,36 +45,95 @@ def itoint(f, G, y0, tspan, noise = "normal"):
     chosenAlgorithm = sdeint.integrate.itoSRI2
     return chosenAlgorithm(f, G, y0, tspan, dW = dW)
 
+def integrate_sde(f, sigma, y0, tspan, noise="normal", method="SRI2",
+                  block_size=1000):
+    """ Numerically integrate the Ito equation  dy = f(y,t)dt + sigma dW
+    with additive noise over the whole time grid tspan in one call.
+    Args:
+      f: callable(y,t) returning a numpy array of the shape of y
+      sigma: scalar or array of shape (d,m) giving the noise coefficients
+      y0: array of shape (d,) giving the initial state vector y(t==0) or of
+        shape (members, d) for an ensemble with independent noise
+      tspan (array): The sequence of time points for which to solve for y.
+        tspan[0] is the intial time corresponding to the initial state y0.
+      noise: "normal", "levy" or "cauchy" increments (as in itoint)
+      method: "SRI2" (Roessler 2010, equals sdeint.itoSRI2 for additive 
+        noise) or "euler" (Euler-Maruyama)
+      block_size: number of time steps for which the increments are drawn 
+        at once
+    Returns:
+      y: array, with shape (len(tspan),) + y0.shape
+         With the initial value y0 in the first row
+    """
+    if method not in ("SRI2", "euler"):
+        raise ValueError("Unknown method " + str(method) + 
+                         ", use 'SRI2' or 'euler'.")
+    tspan = np.asarray(tspan, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    sigma = np.asarray(sigma, dtype=float)
+    if sigma.ndim == 2:
+        m = sigma.shape[1]
+    else:
+        m = y0.shape[-1]
+    N = len(tspan)
+    y = np.empty((N,) + y0.shape)
+    y[0] = y0
+    for start in range(0, N - 1, block_size):
+        stop = min(start + block_size, N - 1)
+        h = np.diff(tspan[start:stop + 1])
+        h_shape = h.reshape((-1,) + (1,) * y0.ndim)
+        size = (h.size,) + y0.shape[:-1] + (m,)
+        if noise == "levy":
+            dW = levy.rvs(0., 1e-11, size) + \
+                 np.random.normal(0., 1., size) * np.sqrt(h_shape)
+        elif noise == "cauchy":
+            dW = cauchy.rvs(0., 1e-4, size)
+        else:
+            dW = np.random.normal(0., 1., size) * np.sqrt(h_shape)
+        if sigma.ndim == 2:
+            dG = dW @ sigma.T
+        else:
+            dG = sigma * dW
+        for k in range(h.size):
+            n = start + k
+            fnh = f(y[n], tspan[n]) * h[k]
+            if method == "euler":
+                y[n+1] = y[n] + fnh + dG[k]
+            else:
+                fn1h = f(y[n] + fnh, tspan[n+1]) * h[k]
+                y[n+1] = y[n] + 0.5 * (fnh + fn1h) + dG[k]
+    return y
+
 class evolve():
     def __init__( self, tipping_network, initial_state ):
+        """An initial_state of shape (members, nodes) evolves an ensemble of 
+        the (compiled) network with independent noise, see 
+        tipping_network.set_ensemble_par."""
         # Initialize solver
         self._net = tipping_network
         # Initialize state
-        self._times = []
-        self._states = []
+        self._trajectory = trajectory()
         
         self._t = 0
-        self._x = initial_state
+        self._x = np.array( initial_state, dtype=float )
 
         self.save_state( self._t, self._x ) 
         
     def save_state( self , t, x):
         """Save current state if save flag is set"""
-        self._times.append( t )
-        self._states.append( x )
+        self._trajectory.append( t, x )
 
     def get_timeseries( self ):
-        times = np.array ( self._times )
-        states = np.array ( self._states )
+        """Returns views of the saved times and states"""
+        times, states = self._trajectory.get()
         return [times , states]
     
-    def _integrate_sde( self, t_step, initial_state, sigma=None, noise = "normal"):
+    def _integrate_sde( self, t_step, initial_state, sigma=None, noise = "normal",
+                        method = "SRI2"):
         
         t_span = [ self._t , self._t + t_step ]
-        x_init = self._x
-         
-        diffusion = lambda x,t: sigma 
-        sol=itoint(self._net.f,diffusion,x_init,t_span, noise = noise)
+        sol = integrate_sde( self._net.f, sigma, self._x, t_span, 
+                             noise = noise, method = method )
         self._t = t_span[1]
         
         self._x = sol[1]        
@@ -80,25 +142,35 @@ class evolve():
     def _integrate_ode( self, t_step):
         
         t_span = [ self._t , self._t + t_step ]
-        x_init = self._x
+        net = self._net
+        if self._x.ndim == 2:
+            net = stacked_network( self._net, self._x.shape )
         
-        sol = odeint( self._net.f , x_init, t_span, Dfun=self._net.jac )
+        sol = odeint( net.f , self._x.ravel(), t_span, Dfun=net.jac )
             
         self._t = t_span[1]
 
-        self._x = sol[1]
+        self._x = sol[1].reshape( self._x.shape )
         
         self.save_state(self._t, self._x)
         
-    def integrate( self, t_step, t_end,initial_state, sigma=None , noise = "normal"):
-        """Manually integrate to t_end"""
+    def integrate( self, t_step, t_end,initial_state, sigma=None , noise = "normal",
+                   method = "SRI2"):
+        """Manually integrate to t_end. With noise (sigma) the whole time 
+        grid is integrated in one call of integrate_sde with the given 
+        method ("SRI2" or "euler")."""
         
         if sigma is None:
-            while self._times[-1] < t_end:
+            while self._t < t_end:
                 self._integrate_ode( t_step )
         else:
-            while self._times[-1] < t_end:
-                    self._integrate_sde( t_step,initial_state,sigma, noise = noise)
+            times = output_times( self._t, t_step, t_end )
+            if times.size > 1:
+                sol = integrate_sde( self._net.f, sigma, self._x, times,
+                                     noise = noise, method = method )
+                self._trajectory.extend( times[1:], sol[1:] )
+                self._t = times[-1]
+                self._x = sol[-1]
     
     def equilibrate( self, tol , t_step, t_break=None,sigma=None ):
         """Iterate system until it is in equilibrium. 
@@ -108,7 +180,7 @@ class evolve():
         
         if sigma is None:
             while not self.is_equilibrium( tol ): 
-                self._integrate_ode( t_step,sigma )
+                self._integrate_ode( t_step )
                 if t_break and (time.process_time() - t0) >= t_break:
                     raise NoEquilibrium(
                             "No equilibrium found " \
@@ -117,7 +189,7 @@ class evolve():
                             )
         else:
             while not self.is_equilibrium( tol ): 
-                self._integrate_sde( t_step,sigma )
+                self._integrate_sde( t_step, self._x, sigma )
                 if t_break and (time.process_time() - t0) >= t_break:
                     raise NoEquilibrium(
                             "No equilibrium found " \
@@ -138,15 +210,8 @@ class evolve():
         else:
             return False
 
-    def is_stable( self ):
+    def is_stable( self, sparse=None ):
         """Check stability of current system state by calculating the 
-        eigenvalues of the jacobian (all eigenvalues < 0 => stable)."""
-        n = self._net.number_of_nodes()
-        jacobian = self._net.jac( self._x, self._t)
-        val, vec = np.linalg.eig( jacobian )
-        stable = np.less( val, np.zeros( n ) )
-
-        if stable.all():
-            return True
-        else:
-            return False
+        eigenvalues of the jacobian (all real parts < 0 => stable), see 
+        jacobian_is_stable."""
+        return jacobian_is_stable( self._net, self._x, self._t, sparse )
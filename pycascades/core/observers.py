@@ -0,0 +1,107 @@
+"""observers module
+
+Provides observers for evolve objects. An observer is registered with
+evolve.add_observer and gets every computed state of the integration as
+update(times, states), independent of the trajectory storage.
+"""
+import numpy as np
+
+class tip_time_recorder:
+    """Records the tipping times of the elements while integrating.
+
+    An element is tipped when its state is above its threshold (by default
+    the tipping thresholds x_0 of the network, elements without threshold
+    are never tipped). For every element the time of the first and of the
+    last crossing into the tipped state and the number of crossings (in
+    both directions) are recorded. Crossing times are linearly interpolated
+    between the steps, without interpolation the time of the first step in
+    the tipped state is recorded. An element tipped in the initial state
+    is tipped at the initial time. For ensembles the values are recorded
+    for the flattened ensemble state.
+    """
+
+    def __init__( self, tipping_network, threshold=None, interpolate=True ):
+        """Constructor"""
+        if threshold is None:
+            threshold = tipping_network.get_tip_thresholds()
+        self._threshold = np.asarray( threshold, dtype=float )
+        self._interpolate = interpolate
+        self._t = None
+        self._x = None
+        self._tipped = None
+        self._first_time = None
+        self._last_time = None
+        self._crossings = None
+
+    def _start( self, t, x ):
+        self._threshold = np.resize( self._threshold, x.size )
+        self._tipped = x > self._threshold
+        self._first_time = np.where( self._tipped, t, np.nan )
+        self._last_time = self._first_time.copy()
+        self._crossings = np.zeros( x.size, dtype=int )
+        self._t, self._x = t, x
+
+    def update( self, times, states ):
+        """Process the states at times (first axis is time)"""
+        times = np.asarray( times, dtype=float )
+        states = np.reshape( np.asarray( states, dtype=float ),
+                             (times.size, -1) )
+        if times.size == 0:
+            return
+        if self._tipped is None:
+            self._start( times[0], states[0] )
+            times, states = times[1:], states[1:]
+            if times.size == 0:
+                return
+
+        tipped = states > self._threshold
+        if ( tipped == self._tipped ).all():
+            # no crossing in the block (fast path for single steps)
+            self._t, self._x = times[-1], states[-1]
+            return
+        t_prev = np.append( self._t, times[:-1] )
+        x_prev = np.vstack( ( self._x, states[:-1] ) )
+        tipped_prev = np.vstack( ( self._tipped, tipped[:-1] ) )
+        change = tipped != tipped_prev
+        self._crossings += np.count_nonzero( change, axis=0 )
+
+        rising = change & tipped
+        nodes = np.nonzero( rising.any( axis=0 ) )[0]
+        if nodes.size:
+            first = np.argmax( rising[:, nodes], axis=0 )
+            last = rising.shape[0] - 1 \
+                   - np.argmax( rising[::-1, nodes], axis=0 )
+            new = np.isnan( self._first_time[nodes] )
+            self._first_time[nodes[new]] = self._crossing_time(
+                    first[new], nodes[new], times, states, t_prev, x_prev )
+            self._last_time[nodes] = self._crossing_time(
+                    last, nodes, times, states, t_prev, x_prev )
+
+        self._tipped = tipped[-1]
+        self._t, self._x = times[-1], states[-1]
+
+    def _crossing_time( self, steps, nodes, times, states, t_prev, x_prev ):
+        """Time of the crossing of the threshold by nodes before steps"""
+        if not self._interpolate:
+            return times[steps]
+        x0, x1 = x_prev[steps, nodes], states[steps, nodes]
+        weight = ( self._threshold[nodes] - x0 ) / ( x1 - x0 )
+        return t_prev[steps] + weight * ( times[steps] - t_prev[steps] )
+
+    def get_tip_states( self ):
+        """Returns the tip states of the last processed state"""
+        return self._tipped
+
+    def get_first_tip_times( self ):
+        """Returns the time of the first crossing into the tipped state
+        (nan for elements that never tipped)"""
+        return self._first_time
+
+    def get_final_tip_times( self ):
+        """Returns the time of the last crossing into the tipped state
+        (nan for elements that never tipped)"""
+        return self._last_time
+
+    def get_crossings( self ):
+        """Returns the number of threshold crossings of the elements"""
+        return self._crossings
@@ -1,36 +1,207 @@
+import gc
 import networkx as nx
 import numpy as np
 from copy import deepcopy
+from pycascades.core.compiled import compiled_network, sparse_pattern
+from pycascades.core.coupling import linear_coupling
+from pycascades.core.tipping_element import cusp, hopf
+
+# element classes and their parameters for tipping_network.from_arrays
+ELEMENT_TYPES = { 'cusp' : ( cusp, ('a', 'b', 'c', 'x_0') ),
+                  'hopf' : ( hopf, ('a', 'c') ) }
        
 class tipping_network(nx.DiGraph):
 
+    # elements and couplings are copied when added to the network
+    _copy_on_add = True
+
     def __init__( self, incoming_graph_data=None, **attr):
         nx.DiGraph.__init__( self, incoming_graph_data=None, **attr)
+        self._compiled = False
+        self._kernel = None
+        self._jac_pattern = None
         
     def add_element( self, tipping_element ):
-        tipping_element = deepcopy(tipping_element)
+        if self._copy_on_add:
+            tipping_element = deepcopy(tipping_element)
+        self._kernel = None
+        self._jac_pattern = None
         ind = self.number_of_nodes()
         super().add_node( ind, data = tipping_element )
         self.nodes[ind]['lambda_f'] = tipping_element.dxdt_diag()
         self.nodes[ind]['lambda_jac'] = tipping_element.jac_diag()
         
     def add_coupling( self, from_id, to_id, coupling):
-        coupling = deepcopy(coupling)
+        if self._copy_on_add:
+            coupling = deepcopy(coupling)
+        self._kernel = None
+        self._jac_pattern = None
         super().add_edge( from_id, to_id, data = coupling)
         self[from_id][to_id]['lambda_f'] = coupling.dxdt_cpl()
         self[from_id][to_id]['lambda_jac'] = coupling.jac_cpl()
         self[from_id][to_id]['lambda_jac_diag'] = coupling.jac_diag()
 
+    @classmethod
+    def from_arrays( cls, element_type, params, edge_index, strengths ):
+        """Build a compiled network of cusp and/or hopf elements with linear
+        couplings in one pass.
+        element_type is 'cusp', 'hopf' or an array of these per node, 
+        params a dict of parameter arrays of shape (nodes,) (or scalars if 
+        the number of nodes is given by the edges), 
+        edge_index an array of shape (2, edges) with the from and to ids and
+        strengths the coupling strengths of shape (edges,).
+        The edges are stored in the order of self.edges(), i.e. sorted by 
+        their from id (stable). f and jac are the same as for a network 
+        built with add_element and add_coupling."""
+        edge_index = np.asarray( edge_index, dtype=np.intp )
+        strengths = np.broadcast_to( np.asarray( strengths, dtype=float ),
+                                     edge_index.shape[1:] )
+        n = max( [np.size( val ) for val in params.values()] +
+                 [np.size( element_type )] + 
+                 [edge_index.max() + 1 if edge_index.size else 0] )
+        types = np.broadcast_to( np.asarray( element_type ), (n,) )
+        for name in np.unique( types ):
+            if name not in ELEMENT_TYPES:
+                raise ValueError( "Element type " + str(name) +
+                                  " is not supported by from_arrays." )
+        par = { key : np.broadcast_to( np.asarray( val, dtype=float ), (n,) )
+                for key, val in params.items() }
+        if edge_index.size and edge_index.min() < 0:
+            raise ValueError( "Negative edge index." )
+        order = np.argsort( edge_index[0], kind='stable' )
+        from_id, to_id = edge_index[0, order], edge_index[1, order]
+        strengths = strengths[order]
+        if np.unique( from_id * n + to_id ).size != from_id.size:
+            raise ValueError( "Duplicate edges." )
+
+        net = cls()
+        def element( ind ):
+            element_class, keys = ELEMENT_TYPES[types[ind]]
+            return element_class( **{ key : par[key][ind] for key in keys } )
+        # the cyclic garbage collector would repeatedly traverse the many 
+        # new objects, it is paused while they are created
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            elements = [element( ind ) for ind in range( n )]
+            nx.DiGraph.add_nodes_from( net, 
+                ( ( ind, { 'data' : el, 'lambda_f' : el.dxdt_diag(),
+                           'lambda_jac' : el.jac_diag() } )
+                  for ind, el in enumerate( elements ) ) )
+            couplings = [linear_coupling( val ) for val in strengths.tolist()]
+            nx.DiGraph.add_edges_from( net,
+                ( ( u, v, { 'data' : cpl, 'lambda_f' : cpl.dxdt_cpl(),
+                            'lambda_jac' : cpl.jac_cpl(),
+                            'lambda_jac_diag' : cpl.jac_diag() } )
+                  for u, v, cpl in zip( from_id.tolist(), to_id.tolist(),
+                                        couplings ) ) )
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        is_hopf = types == 'hopf'
+        zeros = np.zeros( n )
+        get = lambda key : par[key] if key in par else zeros
+        a, b, c = get( 'a' ), get( 'b' ), get( 'c' )
+        net._kernel = compiled_network(
+            np.where( is_hopf, -a, a ), np.where( is_hopf, a * c, b ),
+            np.where( is_hopf, 0., c ), np.where( is_hopf, 0., get( 'x_0' ) ),
+            from_id, to_id, strengths, hopf=is_hopf )
+        net._compiled = True
+        return net
+
     def set_param( self, node_id, key, val ):
         element = self.nodes[node_id]['data']
         element.set_par( key, val)
         self.nodes[node_id]['lambda_f'] = self.nodes[node_id]['data'].dxdt_diag()
         self.nodes[node_id]['lambda_jac'] = self.nodes[node_id]['data'].jac_diag()
+        if self._kernel is not None:
+            self._kernel.set_element_par( node_id, element.get_par(),
+                                          element.get_type() )
+
+    def set_params( self, key, values ):
+        """Set the parameter key of all elements to values (in node order).
+        Elements and the compiled arrays are updated in place, i.e. the 
+        network is not rebuilt."""
+        values = np.asarray( values, dtype=float )
+        elements = [self.nodes[node]['data'] for node in self.nodes()]
+        for element, val in zip( elements, values.tolist() ):
+            element.set_par( key, val )
+        if self._kernel is not None:
+            if all( element.get_type() == 'cusp' for element in elements ):
+                self._kernel.get_par( key )[...] = values
+            else:
+                for node_id, element in enumerate( elements ):
+                    self._kernel.set_element_par( node_id, element.get_par(),
+                                                  element.get_type() )
+
+    def set_strengths( self, values ):
+        """Set the strengths of all couplings to values (in the order of 
+        self.edges()). Couplings and the compiled arrays are updated in 
+        place."""
+        values = np.asarray( values, dtype=float )
+        for edge, val in zip( self.edges( data='data' ), values.tolist() ):
+            edge[2].set_strength( val )
+        if self._kernel is not None:
+            self._kernel.set_strength( values )
+
+    def compile( self, check=True ):
+        """Switch f and jac to the array-backed evaluation of 
+        compiled_network. Cusp and hopf elements with linear and hopf 
+        couplings are supported. The arrays are rebuilt automatically when elements or 
+        couplings are added. If check is set, the compiled f (and jac for 
+        networks with at most 2000 nodes) is compared against the lambda 
+        path."""
+        self._compiled = True
+        self._kernel = None
+        kernel = self.get_kernel()
+        if check:
+            n = self.number_of_nodes()
+            x = kernel.get_par('x_0') + np.linspace( -1, 1, n )
+            self._compiled = False
+            same = np.allclose( kernel.f( x, 1 ), self.f( x, 1 ) )
+            if n <= 2000:
+                same &= np.allclose( kernel.jac( x, 1 ), self.jac( x, 1 ) )
+            self._compiled = True
+            if not same:
+                self._compiled = False
+                raise ValueError("Compiled network does not reproduce f "
+                                 "and jac of the lambda path.")
+
+    def set_ensemble_par( self, key, values ):
+        """Set per-member parameters of an ensemble of networks with the 
+        topology of this network. key is one of 'a', 'b', 'c', 'x_0' with 
+        values of shape (members, nodes) or 'strength' with values of shape 
+        (members, edges) in the order of self.edges(). f and jac then accept
+        states of shape (members, nodes). The network is compiled if 
+        necessary, adding elements or couplings resets the parameters."""
+        if not self._compiled:
+            self.compile()
+        if key == 'strength':
+            self.get_kernel().set_strength( values )
+        else:
+            self.get_kernel().set_par( key, values )
+
+    def get_kernel( self ):
+        """Returns the compiled_network of the current network state"""
+        if self._kernel is None:
+            self._kernel = compiled_network.from_network( self )
+        return self._kernel
 
     def get_tip_states( self, x):
+        if self._compiled:
+            return self.get_kernel().get_tip_states( x )
         tipped = [self.nodes[i]['data'].tip_state()(x[i]) for i in self.nodes()]
         return np.array( tipped )
 
+    def get_tip_thresholds( self ):
+        """Returns the tipping thresholds x_0 of the elements (nan for 
+        elements without threshold in the state variable)"""
+        if self._compiled:
+            return self.get_kernel().get_tip_thresholds()
+        return np.array( [self.nodes[i]['data'].get_par().get('x_0', np.nan)
+                          for i in self.nodes()], dtype=float )
+
     def get_node_types( self ):
         type_list = [self.nodes[i]['data'].get_type() for i in self.nodes()]
         return type_list
@@ -39,6 +210,8 @@ class tipping_network(nx.DiGraph):
         return np.count_nonzero( self.get_tip_states( x ) )
 
     def f( self, x, t):
+        if self._compiled:
+            return self.get_kernel().f( x, t )
         f = np.zeros( self.number_of_nodes() )
         for node in self.nodes(data=True):
             ind = node[0]
@@ -52,6 +225,8 @@ class tipping_network(nx.DiGraph):
         return f
 
     def jac(self, x, t):
+        if self._compiled:
+            return self.get_kernel().jac( x, t )
         jac = np.zeros((self.number_of_nodes(), self.number_of_nodes()))
         for node in self.nodes(data=True):
             ind = node[0]
@@ -65,6 +240,32 @@ class tipping_network(nx.DiGraph):
             lmd_diag = edge[2]['lambda_jac_diag']
             jac[to_id, to_id] += lmd_diag.__call__( t, x[from_id], x[to_id] )
         return jac
+
+    def jac_sparse( self, x, t):
+        """Jacobian as scipy.sparse CSR matrix. The sparsity pattern 
+        (edges and diagonal) is cached and only the data array is refilled,
+        so the returned matrix is overwritten by the next call."""
+        if self._compiled:
+            return self.get_kernel().jac_sparse( x, t )
+        n = self.number_of_nodes()
+        edges = list( self.edges(data=True) )
+        if self._jac_pattern is None:
+            diag = np.arange( n )
+            to_id = np.array( [edge[1] for edge in edges], dtype=int )
+            from_id = np.array( [edge[0] for edge in edges], dtype=int )
+            self._jac_pattern = sparse_pattern( n,
+                    np.concatenate( (to_id, to_id, diag) ),
+                    np.concatenate( (from_id, to_id, diag) ) )
+        vals = np.zeros( 2 * len(edges) + n )
+        for ind, edge in enumerate( edges ):
+            x_from, x_to = x[edge[0]], x[edge[1]]
+            vals[ind] = edge[2]['lambda_jac'].__call__( t, x_from, x_to )
+            vals[len(edges) + ind] = \
+                edge[2]['lambda_jac_diag'].__call__( t, x_from, x_to )
+        for node in self.nodes(data=True):
+            vals[2 * len(edges) + node[0]] = \
+                node[1]['lambda_jac'].__call__( t, x[node[0]] )
+        return self._jac_pattern.fill( vals )
     
     def set_vulnerability(self, node_id, bool_val):
         self.nodes[node_id]["vulnerable"] = bool_val
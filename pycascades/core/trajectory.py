@@ -0,0 +1,108 @@
+"""trajectory module
+
+Provides the storage for the time series of evolve objects.
+"""
+import numpy as np
+
+class trajectory:
+    """Trajectory buffer backed by preallocated ndarrays.
+
+    The buffer grows by doubling its capacity. With save_every=k only every
+    k-th appended sample is stored. With max_length=N only the last N stored
+    samples are kept in a ring (max_length=1 keeps the final state only).
+    The ring is written twice so that the last N samples are always a
+    contiguous slice, i.e. get returns views and never copies.
+    """
+
+    def __init__(self, save_every=1, max_length=None, capacity=1024):
+        """Constructor"""
+        if save_every < 1:
+            raise ValueError("save_every must be a positive integer!")
+        if max_length is not None and max_length < 1:
+            raise ValueError("max_length must be a positive integer!")
+        self._save_every = save_every
+        self._max_length = max_length
+        if max_length is None:
+            self._capacity = capacity
+        else:
+            self._capacity = 2 * max_length
+        self._times = None
+        self._states = None
+        self._count = 0
+        self._size = 0
+
+    def _allocate(self, shape):
+        self._times = np.empty(self._capacity)
+        self._states = np.empty((self._capacity,) + shape)
+
+    def _grow(self, size):
+        capacity = self._times.size
+        while capacity < size:
+            capacity *= 2
+        times = np.empty(capacity)
+        states = np.empty((capacity,) + self._states.shape[1:])
+        times[:self._size] = self._times[:self._size]
+        states[:self._size] = self._states[:self._size]
+        self._times, self._states = times, states
+
+    def append(self, t, x):
+        """Append the state x at time t"""
+        count = self._count
+        self._count += 1
+        if count % self._save_every:
+            return
+        if self._states is None:
+            self._allocate(np.shape(x))
+
+        if self._max_length is None:
+            if self._size == self._times.size:
+                self._grow(self._size + 1)
+            self._times[self._size] = t
+            self._states[self._size] = x
+        else:
+            pos = self._size % self._max_length
+            self._times[pos] = self._times[pos + self._max_length] = t
+            self._states[pos] = self._states[pos + self._max_length] = x
+        self._size += 1
+
+    def extend(self, times, states):
+        """Append a block of states (first axis is time)"""
+        times = np.asarray(times, dtype=float)
+        states = np.asarray(states, dtype=float)
+        keep = (self._count + np.arange(times.size)) % self._save_every == 0
+        self._count += times.size
+        times, states = times[keep], states[keep]
+        if times.size == 0:
+            return
+        if self._states is None:
+            self._allocate(states.shape[1:])
+
+        if self._max_length is None:
+            if self._size + times.size > self._times.size:
+                self._grow(self._size + times.size)
+            self._times[self._size:self._size + times.size] = times
+            self._states[self._size:self._size + times.size] = states
+        else:
+            n = self._max_length
+            skipped = max(times.size - n, 0)
+            pos = (self._size + skipped + np.arange(times.size - skipped)) % n
+            for offset in (0, n):
+                self._times[pos + offset] = times[skipped:]
+                self._states[pos + offset] = states[skipped:]
+        self._size += times.size
+
+    def __len__(self):
+        if self._max_length is None:
+            return self._size
+        return min(self._size, self._max_length)
+
+    def get(self):
+        """Returns views of the stored times and states"""
+        if self._states is None:
+            return np.empty(0), np.empty(0)
+        if self._max_length is None or self._size <= self._max_length:
+            start = 0
+        else:
+            start = self._size % self._max_length
+        stop = start + len(self)
+        return self._times[start:stop], self._states[start:stop]
@@ -1,5 +1,7 @@
-from . import earth, functions_earth_system, timing, tipping_network_earth_system
+from . import earth, functions_earth_system, monte_carlo, result_store, timing, tipping_network_earth_system
 
 from pycascades.earth_system.earth import Earth_System
 from pycascades.earth_system.timing import Timing
+from pycascades.earth_system.monte_carlo import run_ensemble
+from pycascades.earth_system.result_store import result_store
 
@@ -13,6 +13,7 @@ class linear_coupling_earth_system(coupling):
 
     def __init__(self, strength, x_0):
         coupling.__init__(self)
+        self._type = 'linear_shifted'
         self._strength = strength
         self._x_0 = x_0
 
@@ -29,6 +30,70 @@ class linear_coupling_earth_system(coupling):
         return lambda t, x_from, x_to: self._strength * (x_from - self._x_0)
 
 
+def cusp_c(limits, effective_GMT):
+    """Vectorized global_functions.CUSPc(0., limits, effective_GMT)"""
+    limits = np.asarray(limits, dtype=float)
+    if effective_GMT >= 0.:
+        return np.sqrt(4 / 27) / limits * effective_GMT
+    return np.zeros(limits.shape)
+
+
+class parameterized_earth_network(tipping_network):
+    """
+    Earth system network for sweeps over the global mean temperature, the coupling strength and the signs kk0, kk1
+    of the uncertain links. The scenario (GMT, strength, kk0, kk1) is held in an array, set_scenario updates the
+    c values of the elements and the coupling strengths in place (vectorized over nodes and edges), i.e. one
+    network object is reused for all points of a sweep without rebuilding elements, couplings or lambdas.
+    The network is compiled, see tipping_network.compile
+    """
+
+    def __init__(self, timescales, limits, links, effective_GMT, strength, kk0, kk1):
+        """
+        timescales and limits of the elements, links is a list of (from, to, probability fraction, sign) where sign
+        is 1, -1 or the name of the uncertain link sign ('kk0' or 'kk1')
+        """
+        tipping_network.__init__(self)
+        self._timescales = np.array(timescales, dtype=float)
+        self._limits = np.array(limits, dtype=float)
+        self._scenario = np.array([effective_GMT, strength, kk0, kk1], dtype=float)
+
+        for time in self._timescales:
+            self.add_element(cusp(a=-1 / time, b=1 / time, c=0., x_0=0.0))
+        link_data = {}
+        for from_id, to_id, pf, sign in links:
+            link_data[(from_id, to_id)] = (pf / self._timescales[to_id], sign)
+            self.add_coupling(from_id, to_id, linear_coupling_earth_system(strength=0., x_0=-1))
+
+        # per edge in the edge order of the network: strength = factor * strength * sign, the signs are looked up
+        # in [1, kk0, kk1] (negative sign_id for negative links)
+        sign_names = {'kk0': 1, 'kk1': 2}
+        self._link_factor = np.array([link_data[edge][0] for edge in self.edges()])
+        sign = [link_data[edge][1] for edge in self.edges()]
+        self._sign_id = np.array([sign_names.get(val, 0) for val in sign])
+        self._link_factor *= [1 if val in sign_names else val for val in sign]
+
+        self.compile()
+        self.set_scenario()
+
+    def get_scenario(self):
+        """Returns (GMT, strength, kk0, kk1)"""
+        return tuple(self._scenario.tolist())
+
+    def set_scenario(self, effective_GMT=None, strength=None, kk0=None, kk1=None):
+        """Change the scenario, arguments which are None are kept"""
+        for ind, val in enumerate((effective_GMT, strength, kk0, kk1)):
+            if val is not None:
+                self._scenario[ind] = val
+        effective_GMT, strength, kk0, kk1 = self._scenario
+
+        c = cusp_c(self._limits, effective_GMT) / self._timescales
+        signs = np.array([1., kk0, kk1])[self._sign_id]
+        strengths = self._link_factor * strength * signs
+
+        self.set_params('c', c)
+        self.set_strengths(strengths)
+
+
 class Earth_System():
     def __init__(self, gis_time, thc_time, wais_time, amaz_time, limits_gis, limits_thc, limits_wais, limits_amaz,
                   pf_wais_to_gis, pf_thc_to_gis, pf_gis_to_thc, pf_wais_to_thc, pf_gis_to_wais, pf_thc_to_wais, pf_thc_to_amaz):
@@ -84,3 +149,15 @@ class Earth_System():
         net.add_coupling(1, 3, linear_coupling_earth_system(strength=(1 / self._amaz_time) * strength * self._pf_thc_to_amaz * kk1, x_0=-1))
 
         return net
+
+    """
+    same network as earth_network, but the scenario can be changed in place with set_scenario(GMT, strength, kk0, kk1)
+    """
+    def parameterized_network(self, effective_GMT, strength, kk0, kk1):
+        timescales = [self._gis_time, self._thc_time, self._wais_time, self._amaz_time]
+        limits = [self._limits_gis, self._limits_thc, self._limits_wais, self._limits_amaz]
+        links = [(1, 0, self._pf_thc_to_gis, -1), (2, 0, self._pf_wais_to_gis, 1),
+                 (0, 1, self._pf_gis_to_thc, 1), (2, 1, self._pf_wais_to_thc, 'kk0'),
+                 (0, 2, self._pf_gis_to_wais, 1), (1, 2, self._pf_thc_to_wais, 1),
+                 (1, 3, self._pf_thc_to_amaz, 'kk1')]
+        return parameterized_earth_network(timescales, limits, links, effective_GMT, strength, kk0, kk1)
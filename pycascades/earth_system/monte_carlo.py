@@ -0,0 +1,115 @@
+"""
+Monte Carlo module: runs the Earth system network for a set of Latin hypercube samples
+and all "+-" link configurations on a process pool, replacing one python process per sample
+"""
+
+
+import itertools
+from multiprocessing import Pool
+
+import numpy as np
+from pycascades.core.evolve import evolve
+from pycascades.earth_system.earth import Earth_System
+from pycascades.earth_system.result_store import result_store
+from pycascades.earth_system.timing import Timing
+
+
+#columns of a sample, same order as the command line arguments of Main_earth_system.py
+SAMPLE_FIELDS = ["limits_gis", "limits_thc", "limits_wais", "limits_amaz",
+                 "pf_wais_to_gis", "pf_thc_to_gis", "pf_gis_to_thc", "pf_wais_to_thc",
+                 "pf_thc_to_wais", "pf_gis_to_wais", "pf_thc_to_amaz"]
+
+ELEMENTS = ["gis", "thc", "wais", "amaz"]
+
+RESULT_DTYPE = np.dtype([("sample", int), ("wais_to_thc", float), ("thc_to_amaz", float)] +
+                        [(name, float) for name in SAMPLE_FIELDS] +
+                        [("GMT", float), ("strength", float)] +
+                        [("state_" + name, float) for name in ELEMENTS] +
+                        [("n_tipped", int)] +
+                        [("tipped_" + name, bool) for name in ELEMENTS])
+
+#calibration shared by all runs of a worker, set by _init_worker
+_calibration = {}
+
+
+def _init_worker(calibration):
+    _calibration.update(calibration)
+
+
+def run_sample(sample, kk, GMT, strength, duration, t_step, timescales, conv_fac_gis, stop_window=None,
+               stop_margin=0.3):
+    """
+    Run one sample (array in the order of SAMPLE_FIELDS) for the link configuration kk = (kk0, kk1)
+    and return the final states and tip states, see Main_earth_system.py.
+    With stop_window (in years) the run stops as soon as the cascade is complete, i.e. no element tipped
+    within stop_window and all elements are restored from stop_margin towards their thresholds, see evolve.integrate
+    """
+    limits_gis, limits_thc, limits_wais, limits_amaz = sample[0:4]
+    pf_wais_to_gis, pf_thc_to_gis, pf_gis_to_thc, pf_wais_to_thc = sample[4:8]
+    pf_thc_to_wais, pf_gis_to_wais, pf_thc_to_amaz = sample[8:11]
+
+    earth_system = Earth_System(*timescales,
+                                limits_gis, limits_thc, limits_wais, limits_amaz,
+                                pf_wais_to_gis, pf_thc_to_gis, pf_gis_to_thc,
+                                pf_wais_to_thc, pf_gis_to_wais, pf_thc_to_wais, pf_thc_to_amaz)
+    net = earth_system.earth_network(GMT, strength, kk[0], kk[1])
+
+    #only the final state is needed
+    ev = evolve(net, [-1, -1, -1, -1], max_length=1)
+    if stop_window is not None:
+        stop_window = stop_window/conv_fac_gis
+    ev.integrate(t_step, duration/conv_fac_gis, single_call=True, stop_window=stop_window,
+                 margin=stop_margin)
+    state = ev.get_timeseries()[1][-1]
+    return state, net.get_tip_states(state)
+
+
+def _run(task):
+    index, sample, kk, GMT, strength = task
+    state, tipped = run_sample(sample, kk, GMT, strength, _calibration["duration"], _calibration["t_step"],
+                               _calibration["timescales"], _calibration["conv_fac_gis"], _calibration["stop_window"],
+                               _calibration["stop_margin"])
+    row = (index, kk[0], kk[1], *sample, GMT, strength, *state, np.count_nonzero(tipped), *tipped)
+    if _calibration["store"] is not None:
+        result_store(_calibration["store"], RESULT_DTYPE).append([row])
+    return row
+
+
+def run_ensemble(samples, plus_minus_links=None, GMT=2.0, strength=0.25, duration=100000., t_step=15,
+                 processes=None, chunksize=4, stop_window=None, stop_margin=0.3, store=None):
+    """
+    Run all samples (array of shape (number of samples, 11), e.g. lhs_preparator/latin_prob.txt)
+    for all link configurations in plus_minus_links (default: all combinations of -1, 0, +1)
+    on a pool of processes (processes=1 runs in this process).
+    The time calibration (Timing.conversion) is computed once and shared with all workers.
+    With stop_window (in years) each run stops once its cascade is complete instead of running for the full duration,
+    see run_sample
+    With store (file name of a result_store) every worker appends its rows to the store as soon as they are computed
+    Returns a structured array with one row per run, see RESULT_DTYPE
+    """
+    samples = np.atleast_2d(np.asarray(samples, dtype=float))
+    if samples.shape[1] != len(SAMPLE_FIELDS):
+        raise ValueError("Samples must have {} columns: {}".format(len(SAMPLE_FIELDS), SAMPLE_FIELDS))
+    if plus_minus_links is None:
+        plus_minus_links = np.array(list(itertools.product([-1.0, 0.0, 1.0], repeat=2)))
+
+    time_props = Timing()
+    calibration = {"timescales": time_props.timescales(),
+                   "conv_fac_gis": time_props.conversion(),
+                   "duration": duration,
+                   "t_step": t_step,
+                   "stop_window": stop_window,
+                   "stop_margin": stop_margin,
+                   "store": store}
+
+    tasks = [(index, sample, tuple(kk), GMT, strength)
+             for kk in plus_minus_links for index, sample in enumerate(samples)]
+
+    if processes == 1:
+        _init_worker(calibration)
+        rows = [_run(task) for task in tasks]
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=(calibration,)) as pool:
+            rows = pool.map(_run, tasks, chunksize=chunksize)
+
+    return np.array(rows, dtype=RESULT_DTYPE)
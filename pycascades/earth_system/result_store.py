@@ -0,0 +1,161 @@
+"""
+Result store module: collects the results of ensemble runs (one row per run, e.g. monte_carlo.RESULT_DTYPE)
+as columns of one compressed netCDF4 file, replacing one result folder per run.
+Appends of several processes are serialized by a lock file, aggregation over groups of runs is vectorized
+"""
+
+
+from contextlib import contextmanager
+import glob
+import os
+import re
+
+from netCDF4 import Dataset
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+
+#file locks: fcntl on Unix, msvcrt on Windows (no shared locks, readers lock exclusively)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class result_store():
+    """
+    Columnar result store in the file filename. dtype (structured numpy dtype) defines the columns
+    when the file is created, afterwards the columns are taken from the file
+    """
+
+    def __init__(self, filename, dtype=None, chunk_length=1024):
+        self._filename = filename
+        self._dtype = None if dtype is None else np.dtype(dtype)
+        self._chunk_length = chunk_length
+
+    @classmethod
+    def from_directory(cls, directory, filename):
+        """
+        Import the results of the former directory layout of Main_earth_system.py,
+        directory/network_{kk0}_{kk1}/{sample:04d}/ with empirical_values.txt (the command line arguments)
+        and feedbacks_{strength:.2f}.txt (rows of GMT, final states, number of tipped elements and tip states),
+        into a new store filename with the columns of monte_carlo.RESULT_DTYPE.
+        Sample fields of runs without empirical_values.txt are nan
+        """
+        from pycascades.earth_system.monte_carlo import RESULT_DTYPE, SAMPLE_FIELDS
+        if os.path.exists(filename):
+            raise ValueError("Result store {} exists already".format(filename))
+
+        rows = []
+        for folder in sorted(glob.glob(os.path.join(directory, "network_*", "[0-9]*"))):
+            kk0, kk1 = re.split("network_", os.path.basename(os.path.dirname(folder)))[-1].split("_")
+            empirical_values = os.path.join(folder, "empirical_values.txt")
+            if os.path.exists(empirical_values):
+                sys_var = np.loadtxt(empirical_values, ndmin=1)[:len(SAMPLE_FIELDS)]
+            else:
+                sys_var = np.full(len(SAMPLE_FIELDS), np.nan)
+            for feedbacks in sorted(glob.glob(os.path.join(folder, "feedbacks_*.txt"))):
+                strength = float(re.split("feedbacks_", os.path.basename(feedbacks))[-1][:-len(".txt")])
+                for file in np.loadtxt(feedbacks, ndmin=2):
+                    rows.append((int(os.path.basename(folder)), float(kk0), float(kk1), *sys_var, file[0], strength,
+                                 *file[1:5], int(file[5]), *file[6:10].astype(bool)))
+
+        store = cls(filename, RESULT_DTYPE)
+        store.append(np.array(rows, dtype=RESULT_DTYPE))
+        return store
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with open(self._filename + ".lock", "a+") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            elif msvcrt is not None:
+                #locks the first byte of the lock file, msvcrt retries for 10 s before raising OSError
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                raise OSError("File locks (fcntl or msvcrt) are not available on this platform, "
+                              "the result store {} can not be accessed safely".format(self._filename))
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+                else:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _create(self, dataset):
+        if self._dtype is None:
+            raise ValueError("dtype is needed to create the result store {}".format(self._filename))
+        dataset.createDimension("run", None)
+        for name in self._dtype.names:
+            dtype = self._dtype[name]
+            #netCDF has no bool type, the numpy type is restored when reading
+            datatype = np.int8 if dtype == bool else dtype
+            column = dataset.createVariable(name, datatype, ("run",), zlib=True, chunksizes=(self._chunk_length,))
+            column.numpy_dtype = dtype.str
+
+    def append(self, rows):
+        """
+        Append rows (structured array or sequence of tuples in the order of the columns) at the end of the store,
+        safe for concurrent appends of several processes
+        """
+        with self._locked(exclusive=True):
+            exists = os.path.exists(self._filename)
+            with Dataset(self._filename, "a" if exists else "w", format="NETCDF4") as dataset:
+                if not exists:
+                    self._create(dataset)
+                dtype = self._file_dtype(dataset)
+                rows = np.array(rows if isinstance(rows, np.ndarray) else [tuple(row) for row in rows], dtype=dtype)
+                start = dataset.dimensions["run"].size
+                for name in dtype.names:
+                    dataset[name][start:start + rows.size] = rows[name]
+
+    @staticmethod
+    def _file_dtype(dataset):
+        return np.dtype([(name, np.dtype(column.numpy_dtype)) for name, column in dataset.variables.items()])
+
+    def read(self, columns=None):
+        """
+        Returns the columns (default: all) of all runs as structured array
+        """
+        with self._locked(exclusive=False), Dataset(self._filename, "r") as dataset:
+            dtype = self._file_dtype(dataset)
+            if columns is None:
+                columns = dtype.names
+            data = np.empty(dataset.dimensions["run"].size, dtype=[(name, dtype[name]) for name in columns])
+            for name in columns:
+                data[name] = dataset[name][:]
+        return data
+
+    def __len__(self):
+        with self._locked(exclusive=False), Dataset(self._filename, "r") as dataset:
+            return dataset.dimensions["run"].size
+
+    def aggregate(self, by, columns, how="sum"):
+        """
+        Group the runs by the values of the columns in by and aggregate the columns per group
+        ("sum" or "mean"). Returns a structured array with the group values, the number of runs per group (count)
+        and the aggregated columns, sorted by the group values
+        """
+        if how not in ("sum", "mean"):
+            raise ValueError("Aggregation must be 'sum' or 'mean'.")
+        data = self.read(list(by) + list(columns))
+        groups, inverse = np.unique(repack_fields(data[list(by)]), return_inverse=True)
+        inverse = np.ravel(inverse)
+        count = np.bincount(inverse, minlength=groups.size)
+
+        result = np.empty(groups.size, dtype=[(name, data.dtype[name]) for name in by] + [("count", int)] +
+                                             [(name, float) for name in columns])
+        for name in by:
+            result[name] = groups[name]
+        result["count"] = count
+        for name in columns:
+            result[name] = np.bincount(inverse, weights=data[name].astype(float), minlength=groups.size)
+            if how == "mean":
+                result[name] /= count
+        return result
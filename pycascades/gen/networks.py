@@ -1,50 +1,100 @@
 """net_factory module that provides functions to generate networks.
 Some generators have to be supplied with element and coupling pools,
 which are supposed to be lists of element and coupling objects from which
-a random one is chosen for each node and edge respectively."""
+a random one is chosen for each node and edge respectively.
+Networks of cusp and hopf elements with linear couplings are built in bulk
+with tipping_network.from_arrays and are returned compiled."""
 
 from pycascades.core.tipping_network import tipping_network
+from pycascades.core.tipping_element import cusp, hopf
 from pycascades.core.coupling import linear_coupling
 
 from random import choice,uniform,randint,seed
-from copy import deepcopy
 import networkx as nx
-from math import sqrt,exp,ceil
+from math import ceil
 import numpy as np
+from scipy.spatial import cKDTree
 
-def from_nxgraph( G, element_pool, coupling_pool, coupling=None, sd=None):
+def _random_state(sd):
+    """numpy random state seeded with sd, the functions of np.random (using
+    the global state) if sd is None"""
+    if sd is None:
+        return np.random
+    return np.random.RandomState(sd)
 
-    if not nx.is_directed(G):
-        raise ValueError("Only directed graphs supported!")
+def _from_arrays(elements, edges, couplings):
+    """Bulk construction of the network, see tipping_network.from_arrays"""
+    types = [element.get_type() for element in elements]
+    params = {}
+    for key in ('a', 'b', 'c', 'x_0'):
+        params[key] = [element.get_par().get(key, 0.) for element in elements]
+    strengths = [cpl._strength for cpl in couplings]
+    return tipping_network.from_arrays(types, params, edges.T, strengths)
 
+def _from_edges(number, edges, element_pool, coupling_pool, coupling=None):
+    """Network of number elements and the edges given as array of shape 
+    (edges, 2), see from_nxgraph"""
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
     couplings = []
     if coupling == 'uniform':
-        seed_list=np.random.randint(0,100*G.number_of_edges(),
-                                    size=G.number_of_edges())
-        for ind in range(G.number_of_edges()):
+        seed_list=np.random.randint(0,100*edges.shape[0],
+                                    size=edges.shape[0])
+        for ind in range(edges.shape[0]):
             seed(seed_list[ind])
             strength = uniform(coupling_pool[0],coupling_pool[1])
             couplings.append( linear_coupling( strength ) )
     else:
-        for ind in range(G.number_of_edges()):
+        for ind in range(edges.shape[0]):
             couplings.append( choice(coupling_pool) )
 
+    elements = [choice(element_pool) for node in range(number)]
+    if all(type(element) in (cusp, hopf) for element in element_pool) and \
+       all(type(cpl) is linear_coupling for cpl in couplings):
+        return _from_arrays(elements, edges, couplings)
 
     net = tipping_network()
 
-    for node in G.nodes():
-        net.add_element(choice(element_pool))
+    for element in elements:
+        net.add_element(element)
 
-    for ind, edge in enumerate(G.edges()):
+    for ind, edge in enumerate(edges.tolist()):
         net.add_coupling( edge[0], edge[1], couplings[ind] )
 
     return net
 
+def from_nxgraph( G, element_pool, coupling_pool, coupling=None, sd=None):
+
+    if not nx.is_directed(G):
+        raise ValueError("Only directed graphs supported!")
+
+    return _from_edges(G.number_of_nodes(), list(G.edges()), element_pool,
+                       coupling_pool, coupling)
+
 def complete_graph( number, element_pool, coupling_pool):
     G = nx.complete_graph(number, nx.DiGraph())
     net = from_nxgraph(G, element_pool, coupling_pool)
     return net
 
+def _random_edges(number, count, existing, rng, weights=None):
+    """count new distinct edges (u, v), u != v, which are not in the sorted
+    array of edge keys u*number+v existing. Pairs are drawn uniformly and 
+    accepted with probability weights(u, v) if given."""
+    new = np.zeros(0, dtype=np.int64)
+    while new.size < count:
+        size = 2 * (count - new.size) + 16
+        u = rng.randint(0, number, size=size).astype(np.int64)
+        v = rng.randint(0, number, size=size).astype(np.int64)
+        keep = u != v
+        if weights is not None:
+            keep &= rng.uniform(0, 1, size=size) < weights(u, v)
+        keys = u[keep] * number + v[keep]
+        keys = keys[~np.isin(keys, existing, assume_unique=False)]
+        keys = np.concatenate((new, keys))
+        _, first = np.unique(keys, return_index=True)
+        new = keys[np.sort(first)]
+    new = new[:count]
+    return np.stack((new // number, new % number), axis=1)
+
 def directed_watts_strogatz_graph(n, degree, beta, element_pool, coupling_pool,
                                   sd=None):
     k = ceil(degree/2)*2
@@ -55,145 +105,318 @@ def directed_watts_strogatz_graph(n, degree, beta, element_pool, coupling_pool,
     if k == n:
         return nx.complete_graph(n)
 
-    G = nx.Graph()
-    nodes = list(range(n))  # nodes are labeled 0 to n-1
-    # connect each node to k/2 neighbors
-    for j in range(1, k // 2 + 1):
-        targets = nodes[j:] + nodes[0:j]  # first j nodes are now last in list
-        G.add_edges_from(zip(nodes, targets))
-    
-    G = nx.DiGraph(G)
-    
-    while (G.number_of_edges()/G.number_of_nodes()) > degree:
-        G.remove_edge(*choice(list(G.edges())))
+    rng = _random_state(sd)
+    # ring lattice, each node connected to k/2 neighbors on both sides
+    nodes = np.arange(n, dtype=np.int64)
+    edges = np.concatenate([np.stack((nodes, (nodes + j) % n), axis=1)
+                            for j in range(1, k // 2 + 1)])
+    edges = np.concatenate((edges, edges[:, ::-1]))
 
-    edges = deepcopy(G.edges())
-    
-    for edge in edges:
-        if uniform(0,1) < beta:
-            G.remove_edge(edge[0],edge[1])
-            while True:
-                edge = (randint(0, G.number_of_nodes()-1), 
-                        randint(0, G.number_of_nodes()-1))
-                if not G.has_edge(edge[0], edge[1]) and edge[0] != edge[1]:
-                    G.add_edge(edge[0], edge[1])
-                    break   
-    
-    net = from_nxgraph(G, element_pool, coupling_pool)
+    # remove random edges down to the average degree
+    number_of_edges = int(np.floor(degree * n))
+    if edges.shape[0] > number_of_edges:
+        keep = rng.choice(edges.shape[0], number_of_edges, replace=False)
+        edges = edges[np.sort(keep)]
+
+    # rewire each edge with probability beta to a new random edge
+    rewire = rng.uniform(0, 1, size=edges.shape[0]) < beta
+    edges = edges[~rewire]
+    existing = np.sort(edges[:, 0] * n + edges[:, 1])
+    edges = np.concatenate((edges, _random_edges(n, np.count_nonzero(rewire),
+                                                 existing, rng)))
+
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    net = _from_edges(n, edges, element_pool, coupling_pool)
     return net
 
 def directed_barabasi_albert_graph(number, average_degree, element_pool, 
-                                   coupling_pool, sd=None):
-    G = G=nx.DiGraph()
-    G.add_nodes_from([0,1])
-    G.add_edges_from([(0,1),(1,0)])
-
-    while G.number_of_nodes() < number:
-        ind = G.number_of_nodes()
-        G.add_node( ind )
-        for node in G.nodes():
-            p = G.degree(node) / G.number_of_edges()
-            if uniform(0,1) < p:
-                G.add_edge( ind, node)
-            if uniform(0,1) < p:
-                G.add_edge( node, ind)
-    
-    deg = G.number_of_edges() / G.number_of_nodes()
-    while deg < average_degree:
-        node1 = randint(0, number-1)
-        node2 = randint(0, number-1)
-        if node1 == node2:
-            continue
-        p = (G.degree(node1) + G.degree(node2)) / (2*G.number_of_edges())
-        if uniform(0,1) < p:
-            G.add_edge(node1, node2)
-        deg = G.number_of_edges() / G.number_of_nodes()
-        
-    while deg > average_degree:
-        edge = (randint(0, number-1), randint(0, number-1))
-        if G.has_edge(edge[0],edge[1]):
-            G.remove_edge(*edge)
-            deg = G.number_of_edges() / G.number_of_nodes()
+                                   coupling_pool, sd=None, exact_nodes=500):
+    """Directed preferential attachment: each existing node is linked to 
+    the new node (in both directions independently) with probability 
+    degree / number of edges, the expected number of links per direction is
+    2. This is done exactly for the first exact_nodes nodes (None: all 
+    nodes). For the later nodes the number of links per direction is drawn 
+    from the Poisson distribution with mean 2 and the targets are chosen 
+    with probability proportional to their degree, duplicate links are 
+    dropped. This approximates the per-node draws (slightly fewer links to
+    high degree nodes) at a cost independent of the network size. 
+    Afterwards random edges are added or removed to average_degree."""
+    rng = _random_state(sd)
+    # For small networks the links are drawn for each node.
+    if exact_nodes is None:
+        exact = number
+    else:
+        exact = min(number, max(exact_nodes, 2))
+    degree = np.zeros(exact, dtype=np.int64)
+    degree[:2] = 2
+    from_id, to_id = [np.array([0, 1])], [np.array([1, 0])]
+    for ind in range(2, exact):
+        p = degree[:ind] / (degree.sum() // 2)
+        out = np.flatnonzero(rng.uniform(0, 1, size=ind) < p)
+        inc = np.flatnonzero(rng.uniform(0, 1, size=ind) < p)
+        degree[out] += 1
+        degree[inc] += 1
+        degree[ind] = out.size + inc.size
+        from_id += [np.full(out.size, ind), inc]
+        to_id += [out, np.full(inc.size, ind)]
+    from_id, to_id = np.concatenate(from_id), np.concatenate(to_id)
 
-    net = from_nxgraph(G, element_pool, coupling_pool)
+    # Later the number of links is drawn from the Poisson distribution and 
+    # their targets uniformly from the list of edge endpoints (each node 
+    # appears once per unit of its degree). Each link l of node ind appends
+    # the endpoints (ind, target), the target at endpoint slot r < number 
+    # of endpoints before node ind is resolved by pointer jumping.
+    if number > exact:
+        endpoints = np.concatenate((from_id, to_id))
+        steps = np.arange(exact, number)
+        counts = rng.poisson(2., size=(steps.size, 2))
+        links = counts.sum(axis=1)
+        first = np.cumsum(links) - links
+        step = np.repeat(steps, links)
+        local = np.arange(links.sum()) - np.repeat(first, links)
+        is_out = local < np.repeat(counts[:, 0], links)
+        size = endpoints.size + 2 * np.repeat(first, links)
+        target = np.floor(rng.uniform(0, 1, size=step.size) * size)
+
+        slots = endpoints.size + 2 * step.size
+        values = np.zeros(slots, dtype=np.int64)
+        values[:endpoints.size] = endpoints
+        values[endpoints.size::2] = step
+        ptr = np.arange(slots)
+        ptr[endpoints.size + 1::2] = target.astype(np.int64)
+        while np.any(ptr[ptr] != ptr):
+            ptr = ptr[ptr]
+        target = values[ptr[endpoints.size + 1::2]]
+
+        from_id = np.concatenate((from_id, np.where(is_out, step, target)))
+        to_id = np.concatenate((to_id, np.where(is_out, target, step)))
+    edges = np.stack((from_id, to_id), axis=1).astype(np.int64)
+    _, first = np.unique(edges[:, 0] * number + edges[:, 1],
+                         return_index=True)
+    edges = edges[np.sort(first)]
+
+    # add edges between random nodes, accepted with probability
+    # (degree of node1 + degree of node2) / (2 * number of edges)
+    degree = np.bincount(edges.ravel(), minlength=number)
+    missing = int(np.ceil(average_degree * number)) - edges.shape[0]
+    if missing > 0:
+        existing = np.sort(edges[:, 0] * number + edges[:, 1])
+        weights = lambda u, v: (degree[u] + degree[v]) / (2 * edges.shape[0])
+        edges = np.concatenate((edges, _random_edges(number, missing, 
+                                                     existing, rng, weights)))
+
+    # remove random edges
+    number_of_edges = int(np.floor(average_degree * number))
+    if edges.shape[0] > number_of_edges:
+        keep = rng.choice(edges.shape[0], number_of_edges, replace=False)
+        edges = edges[np.sort(keep)]
+
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    net = _from_edges(number, edges, element_pool, coupling_pool)
     return net
 
-"""Spatial Graph generated with the Waxman model on a two-dimensional plane"""
+"""Spatial Graph generated with the Waxman model on a two-dimensional plane:
+each directed edge exists with probability beta*exp(-dist/characteristic_length).
+Candidate pairs are found with a KD-tree within the distance beyond which the
+probability is below p_min."""
 def spatial_graph(number, beta, characteristic_length, element_pool,
-                  coupling_pool, sd=None):
-    
-    G = nx.complete_graph(number, nx.DiGraph())
-    
-    for node in G.nodes(data=True):
-        node[1]['pos'] = (uniform(0,1), uniform(0,1))
-    
-    remove = []
-    for edge in G.edges():
-        dist = sqrt(pow(G.nodes[edge[1]]['pos'][0] - 
-                        G.nodes[edge[0]]['pos'][0], 2) +
-                    pow(G.nodes[edge[1]]['pos'][1] - 
-                        G.nodes[edge[0]]['pos'][1], 2))
-    
-        probability = 1 - beta*exp(-dist/characteristic_length)
-        if uniform(0,1) < probability:
-            remove.append(edge)
+                  coupling_pool, sd=None, p_min=1e-8):
+    rng = _random_state(sd)
+    pos = rng.uniform(0, 1, size=(number, 2))
 
-    for edge in remove:
-        G.remove_edge(*edge)
+    if beta > p_min:
+        cutoff = characteristic_length * np.log(beta / p_min)
+        pairs = cKDTree(pos).query_pairs(cutoff, output_type='ndarray')
+    else:
+        pairs = np.zeros((0, 2), dtype=int)
+    dist = np.linalg.norm(pos[pairs[:, 0]] - pos[pairs[:, 1]], axis=1)
+    probability = beta * np.exp(-dist / characteristic_length)
+    # both directions of a pair are drawn independently
+    forward = rng.uniform(0, 1, size=dist.size) < probability
+    backward = rng.uniform(0, 1, size=dist.size) < probability
+    edges = np.concatenate((pairs[forward], pairs[backward][:, ::-1]))
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
 
-    net = from_nxgraph(G, element_pool, coupling_pool)
-    for node in net.nodes(data=True):
-        node[1]['pos'] = G.nodes[node[0]]['pos']
+    net = _from_edges(number, edges, element_pool, coupling_pool)
+    for node, p in zip(net.nodes(), pos.tolist()):
+        net.nodes[node]['pos'] = tuple(p)
     return net
 
+class _edge_order:
+    """Directed edges in the order of nx.DiGraph.edges (by source node, the
+    successors of a node in insertion order). The k-th edge is found with a
+    Fenwick tree of the out-degrees."""
+
+    def __init__(self, number, edges):
+        self.number = number
+        self.succ = [{} for node in range(number)]
+        self.tree = [0] * (number + 1)
+        self.size = 0
+        for u, v in edges:
+            self.add(u, v)
+
+    def _update(self, node, change):
+        node += 1
+        while node <= self.number:
+            self.tree[node] += change
+            node += node & -node
+        self.size += change
+
+    def has_edge(self, u, v):
+        return v in self.succ[u]
+
+    def add(self, u, v):
+        self.succ[u][v] = None
+        self._update(u, 1)
+
+    def remove(self, u, v):
+        del self.succ[u][v]
+        self._update(u, -1)
+
+    def __getitem__(self, k):
+        # largest node with less than k + 1 edges before it
+        node, step = 0, 1 << self.number.bit_length()
+        while step:
+            if node + step <= self.number and self.tree[node + step] <= k:
+                node += step
+                k -= self.tree[node]
+            step >>= 1
+        for ind, v in enumerate(self.succ[node]):
+            if ind == k:
+                return node, v
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for u in range(self.number):
+            for v in self.succ[u]:
+                yield u, v
+
 def random_reciprocity_model(number, p, reciprocity, element_pool,
                              coupling_pool, sd=None):
     G = nx.erdos_renyi_graph(number, p/2, directed=False, seed=sd)
-    G = nx.DiGraph(G)
+    edges = _edge_order(number, nx.DiGraph(G).edges())
+    # number of edges whose reverse edge exists
+    reciprocal = len(edges)
     
     if sd:
         seed(2*sd)
-    while nx.reciprocity(G) > reciprocity:
-        edge = choice(list(G.edges()))
-        G.remove_edge(*edge)
+    # same random draws and edge order as with nx.reciprocity and 
+    # choice(list(G.edges())) on the DiGraph
+    while edges and reciprocal / len(edges) > reciprocity:
+        u, v = edges[randint(0, len(edges)-1)]
+        edges.remove(u, v)
+        if edges.has_edge(v, u):
+            reciprocal -= 2
         while True:
-            edge = (randint(0, G.number_of_nodes()-1), 
-                    randint(0, G.number_of_nodes()-1))
-            if not G.has_edge(edge[0], edge[1]) and edge[0] != edge[1]:
-                G.add_edge(edge[0], edge[1])
+            edge = (randint(0, number-1), randint(0, number-1))
+            if not edges.has_edge(*edge) and edge[0] != edge[1]:
                 break
+        edges.add(*edge)
+        if edges.has_edge(edge[1], edge[0]):
+            reciprocal += 2
     
-    net = from_nxgraph(G, element_pool, coupling_pool)
+    net = _from_edges(number, list(edges), element_pool, coupling_pool)
     return net
 
+class _directed_clustering:
+    """Directed graph as indexable edge list with adjacency sets. The 
+    average clustering (as nx.average_clustering) is updated incrementally
+    when edges are added or removed: the directed triangles change only at
+    the two end nodes and their common neighbors."""
+
+    def __init__(self, number):
+        self.number = number
+        self.edges = []
+        self.succ = [set() for node in range(number)]
+        self.pred = [set() for node in range(number)]
+        self.triangles = [0] * number
+        self.dtotal = [0] * number
+        self.dbidirectional = [0] * number
+        self.total = 0.
+
+    def clustering(self, node):
+        t = self.triangles[node]
+        if t == 0:
+            return 0.
+        dt = self.dtotal[node]
+        return t / ((dt * (dt - 1) - 2 * self.dbidirectional[node]) * 2)
+
+    def average_clustering(self):
+        return self.total / self.number
+
+    def _change(self, u, v, sign):
+        succ, pred = self.succ, self.pred
+        # entries S = A + A^T for the common neighbors of u and v
+        weights = {}
+        for w in (succ[u] | pred[u]) - {v}:
+            s_vw = (w in succ[v]) + (w in pred[v])
+            if s_vw:
+                weights[w] = ((w in succ[u]) + (w in pred[u])) * s_vw
+        nodes = [u, v] + list(weights)
+        self.total -= sum(self.clustering(node) for node in nodes)
+        common = sum(weights.values())
+        self.triangles[u] += 2 * sign * common
+        self.triangles[v] += 2 * sign * common
+        for w, weight in weights.items():
+            self.triangles[w] += 2 * sign * weight
+        self.dtotal[u] += sign
+        self.dtotal[v] += sign
+        if u in succ[v]:
+            self.dbidirectional[u] += sign
+            self.dbidirectional[v] += sign
+        self.total += sum(self.clustering(node) for node in nodes)
+
+    def has_edge(self, u, v):
+        return v in self.succ[u]
+
+    def add_edge(self, u, v):
+        if u == v or self.has_edge(u, v):
+            return
+        self._change(u, v, 1)
+        self.succ[u].add(v)
+        self.pred[v].add(u)
+        self.edges.append((u, v))
+
+    def replace_edge(self, ind, u, v):
+        """Replace the edge at position ind of the edge list by (u, v)"""
+        old_u, old_v = self.edges[ind]
+        self.succ[old_u].remove(old_v)
+        self.pred[old_v].remove(old_u)
+        self._change(old_u, old_v, -1)
+        self._change(u, v, 1)
+        self.succ[u].add(v)
+        self.pred[v].add(u)
+        self.edges[ind] = (u, v)
+
 def random_clustering_model(number, edge_number, clustering, element_pool,
                             coupling_pool, sd=None):
     if sd:
         seed(2*sd)
     
-    G = nx.empty_graph(number, create_using=nx.DiGraph())
+    G = _directed_clustering(number)
     
-    while G.number_of_edges() < edge_number:
-        n1 = randint(0, G.number_of_nodes()-1)
-        n2 = randint(0, G.number_of_nodes()-1)
-        n3 = randint(0, G.number_of_nodes()-1)
+    while len(G.edges) < edge_number:
+        n1 = randint(0, number-1)
+        n2 = randint(0, number-1)
+        n3 = randint(0, number-1)
         if not (n1 == n2 or n2 == n3 or n1 == n3):
-            G.add_edges_from([(n1,n2),(n2,n1),(n2,n3),(n3,n2),(n3,n1),(n1,n3)])
+            for edge in [(n1,n2),(n2,n1),(n2,n3),(n3,n2),(n3,n1),(n1,n3)]:
+                G.add_edge(*edge)
 
-    if nx.average_clustering(G) < clustering:
+    if G.average_clustering() < clustering:
         raise ValueError("Clustering too large too achieve!")
 
-    while nx.average_clustering(G) > clustering:
-        edge = choice(list(G.edges()))
-        G.remove_edge(*edge)
+    while G.average_clustering() > clustering:
+        ind = randint(0, len(G.edges)-1)
         while True:
-            edge = (randint(0, G.number_of_nodes()-1), 
-                    randint(0, G.number_of_nodes()-1))
+            edge = (randint(0, number-1), randint(0, number-1))
             if not G.has_edge(edge[0], edge[1]) and edge[0] != edge[1]:
-                G.add_edge(edge[0], edge[1])
                 break
+        G.replace_edge(ind, *edge)
     
-    net = from_nxgraph(G, element_pool, coupling_pool)
+    net = _from_edges(number, sorted(G.edges), element_pool, coupling_pool)
     return net
 
 def directed_configuration_model(original_network, element_pool,
@@ -1 +1 @@
-from . import plotter
\ No newline at end of file
+from . import plotter, writer
@@ -0,0 +1,155 @@
+"""writer module
+
+Provides a writer streaming the states of an evolve object to a chunked,
+compressed netCDF4 (HDF5) file. The writer is an observer:
+
+    with writer.netcdf_writer("run.nc", net, attrs={"GMT": 2.0}) as out:
+        ev.add_observer(out)
+        ev.integrate(t_step, t_end)
+
+The file holds the variables time (time), state (time, [member,] node) and
+the parameters of the network, it can be read lazily with netCDF4.Dataset.
+"""
+from netCDF4 import Dataset
+import numpy as np
+
+# target size of a chunk of the state variable in bytes
+CHUNK_BYTES = 2**20
+
+class netcdf_writer:
+    """Observer writing every save_every-th state to a netCDF4 file.
+
+    States are buffered and written in blocks of the chunk length along the
+    time axis (default: chunks of about CHUNK_BYTES). Ensemble states are
+    stored with a member dimension. Node parameters of the elements, the
+    edges with their coupling strengths and, for compiled networks, the
+    per-member parameters set by set_ensemble_par are stored as variables,
+    attrs as global attributes.
+    """
+
+    def __init__( self, filename, tipping_network, save_every=1,
+                  chunk_length=None, complevel=4, attrs=None ):
+        """Constructor"""
+        if save_every < 1:
+            raise ValueError("save_every must be a positive integer!")
+        self._net = tipping_network
+        self._n = tipping_network.number_of_nodes()
+        self._save_every = save_every
+        self._chunk_length = chunk_length
+        self._complevel = complevel
+        self._count = 0
+        self._size = 0
+        self._times = []
+        self._states = []
+        self._buffered = 0
+        self._shape = None
+
+        self._dataset = Dataset( filename, 'w', format='NETCDF4' )
+        self._dataset.setncatts( attrs or {} )
+        self._dataset.createDimension( 'time', None )
+        self._dataset.createDimension( 'node', self._n )
+        self._dataset.createDimension( 'edge',
+                                       tipping_network.number_of_edges() )
+        self._write_network()
+
+    def _write_network( self ):
+        """Element types and parameters, edges and coupling strengths"""
+        net = self._net
+        types = self._dataset.createVariable( 'element_type', str, 'node' )
+        types[:] = np.array( net.get_node_types(), dtype=object )
+        pars = [net.nodes[i]['data'].get_par() for i in net.nodes()]
+        for key in sorted( set().union( *pars ) ):
+            values = [par.get( key, np.nan ) for par in pars]
+            self._variable( key, ('node',), values )
+        edges = list( net.edges( data=True ) )
+        self._variable( 'from_id', ('edge',), [e[0] for e in edges], 'i8' )
+        self._variable( 'to_id', ('edge',), [e[1] for e in edges], 'i8' )
+        self._variable( 'strength', ('edge',),
+                        [getattr( e[2]['data'], '_strength', np.nan )
+                         for e in edges] )
+
+    def _write_members( self, members ):
+        """Per-member parameters of a compiled network"""
+        self._dataset.createDimension( 'member', members )
+        if not getattr( self._net, '_compiled', False ):
+            return
+        kernel = self._net.get_kernel()
+        for key in ['a', 'b', 'c', 'x_0']:
+            values = kernel.get_par( key )
+            if np.ndim( values ) == 2:
+                self._variable( 'member_' + key, ('member', 'node'), values )
+        strength = kernel.get_strength()
+        if np.ndim( strength ) == 2:
+            self._variable( 'member_strength', ('member', 'edge'), strength )
+
+    def _variable( self, name, dimensions, values, datatype='f8' ):
+        variable = self._dataset.createVariable( name, datatype, dimensions,
+                                                 zlib=True,
+                                                 complevel=self._complevel )
+        variable[:] = np.asarray( values )
+
+    def _create_state( self, size ):
+        members = size // self._n
+        if members * self._n != size:
+            raise ValueError("State size is not a multiple of the number "
+                             "of nodes.")
+        if members > 1:
+            self._write_members( members )
+            self._shape = (members, self._n)
+            dimensions = ('time', 'member', 'node')
+        else:
+            self._shape = (self._n,)
+            dimensions = ('time', 'node')
+        if self._chunk_length is None:
+            self._chunk_length = max( CHUNK_BYTES // (8 * size), 1 )
+        self._dataset.createVariable( 'time', 'f8', ('time',),
+                                      chunksizes=(self._chunk_length,) )
+        self._dataset.createVariable( 'state', 'f8', dimensions, zlib=True,
+                                      complevel=self._complevel,
+                                      chunksizes=(self._chunk_length,)
+                                                 + self._shape )
+
+    def update( self, times, states ):
+        """Buffer every save_every-th of the states at times (first axis is
+        time), the buffer is written when it holds a chunk"""
+        times = np.asarray( times, dtype=float )
+        states = np.reshape( np.asarray( states, dtype=float ),
+                             (times.size, -1) )
+        keep = (self._count + np.arange( times.size )) \
+               % self._save_every == 0
+        self._count += times.size
+        if not keep.any():
+            return
+        if self._shape is None:
+            self._create_state( states.shape[1] )
+        self._times.append( times[keep] )
+        self._states.append( states[keep] )
+        self._buffered += np.count_nonzero( keep )
+        if self._buffered >= self._chunk_length:
+            self.flush()
+
+    def flush( self ):
+        """Write the buffered states to the file"""
+        if not self._buffered:
+            return
+        times = np.concatenate( self._times )
+        states = np.concatenate( self._states )
+        stop = self._size + times.size
+        self._dataset['time'][self._size:stop] = times
+        self._dataset['state'][self._size:stop] = \
+            states.reshape( (times.size,) + self._shape )
+        self._size = stop
+        self._times, self._states, self._buffered = [], [], 0
+        self._dataset.sync()
+
+    def close( self ):
+        """Write the buffered states and close the file"""
+        if self._dataset.isopen():
+            self.flush()
+            self._dataset.close()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *args ):
+        self.close()
@@ -0,0 +1,56 @@
+"""Tests of the bookkeeping of the network generators in gen.networks"""
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from pycascades.core.coupling import linear_coupling
+from pycascades.core.tipping_element import cusp
+from pycascades.gen.networks import _directed_clustering, \
+    directed_barabasi_albert_graph
+
+
+def _nx_graph(clustering):
+    G = nx.DiGraph()
+    G.add_nodes_from(range(clustering.number))
+    G.add_edges_from(clustering.edges)
+    return G
+
+
+def test_incremental_average_clustering():
+    rng = random.Random(1)
+    number = 30
+    G = _directed_clustering(number)
+    while len(G.edges) < 150:
+        u, v = rng.randrange(number), rng.randrange(number)
+        if u != v and not G.has_edge(u, v):
+            G.add_edge(u, v)
+            if len(G.edges) % 10 == 0:
+                assert G.average_clustering() == pytest.approx(
+                    nx.average_clustering(_nx_graph(G)), abs=1e-12)
+    for step in range(300):
+        ind = rng.randrange(len(G.edges))
+        u, v = rng.randrange(number), rng.randrange(number)
+        if u == v or G.has_edge(u, v):
+            continue
+        G.replace_edge(ind, u, v)
+        if step % 10 == 0:
+            assert G.average_clustering() == pytest.approx(
+                nx.average_clustering(_nx_graph(G)), abs=1e-12)
+    assert G.average_clustering() == pytest.approx(
+        nx.average_clustering(_nx_graph(G)), abs=1e-12)
+
+
+@pytest.mark.parametrize("number, average_degree, exact_nodes",
+                         [(50, 2., 500), (300, 3.5, 100), (1200, 2.5, 500),
+                          (1200, 4., None)])
+def test_barabasi_albert_edges(number, average_degree, exact_nodes):
+    net = directed_barabasi_albert_graph(number, average_degree, [cusp()],
+                                         [linear_coupling(0.1)], sd=5,
+                                         exact_nodes=exact_nodes)
+    edges = np.array(list(net.edges()))
+    assert net.number_of_nodes() == number
+    assert not np.any(edges[:, 0] == edges[:, 1])
+    assert np.unique(edges, axis=0).shape[0] == edges.shape[0]
+    assert edges.shape[0] == int(np.floor(average_degree * number))
@@ -0,0 +1,41 @@
+"""Regression tests of the sparse stability check evolve.jacobian_is_stable"""
+import numpy as np
+from scipy.sparse import csc_matrix, diags
+
+from pycascades.core.evolve import jacobian_is_stable
+
+
+class jacobian_network():
+    """Stand-in network with a fixed jacobian"""
+    def __init__(self, jacobian):
+        self._jacobian = csc_matrix(jacobian)
+
+    def jac(self, x, t):
+        return self._jacobian.toarray()
+
+    def jac_sparse(self, x, t):
+        return self._jacobian
+
+
+def complex_pair_network(real_part, n=600, imag_part=10.):
+    """Real spectrum in [-3, -1] and the pair real_part +- imag_part i"""
+    diagonal = -np.linspace(1., 3., n)
+    diagonal[:2] = real_part
+    jacobian = diags(diagonal).tolil()
+    jacobian[0, 1] = imag_part
+    jacobian[1, 0] = -imag_part
+    return jacobian_network(jacobian)
+
+
+def test_unstable_complex_pair():
+    net = complex_pair_network(0.1)
+    x = np.zeros(600)
+    assert not jacobian_is_stable(net, x, 0, sparse=False)
+    assert not jacobian_is_stable(net, x, 0, sparse=True)
+
+
+def test_stable_complex_pair():
+    net = complex_pair_network(-0.1)
+    x = np.zeros(600)
+    assert jacobian_is_stable(net, x, 0, sparse=False)
+    assert jacobian_is_stable(net, x, 0, sparse=True)
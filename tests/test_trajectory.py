@@ -0,0 +1,44 @@
+"""Tests of the trajectory buffer against a plain list"""
+import numpy as np
+import pytest
+
+from pycascades.core.trajectory import trajectory
+
+
+@pytest.mark.parametrize("save_every", [1, 3])
+@pytest.mark.parametrize("max_length", [None, 1, 4, 50])
+def test_trajectory_matches_list(save_every, max_length):
+    rng = np.random.RandomState(0)
+    buffer = trajectory(save_every, max_length, capacity=2)
+    times, states, count = [], [], 0
+    for step in range(200):
+        if step % 5 == 0:
+            block_times = np.arange(count, count + 7, dtype=float)
+            block_states = rng.uniform(size=(7, 3))
+            buffer.extend(block_times, block_states)
+        else:
+            block_times = [float(count)]
+            block_states = [rng.uniform(size=3)]
+            buffer.append(block_times[0], block_states[0])
+        for t, x in zip(block_times, block_states):
+            if count % save_every == 0:
+                times.append(t)
+                states.append(x)
+            count += 1
+
+        if max_length is not None:
+            times, states = times[-max_length:], states[-max_length:]
+        stored_times, stored_states = buffer.get()
+        assert len(buffer) == len(times)
+        np.testing.assert_array_equal(stored_times, times)
+        np.testing.assert_array_equal(stored_states, np.array(states))
+
+
+def test_trajectory_get_returns_views():
+    buffer = trajectory(max_length=3)
+    for t in range(10):
+        buffer.append(float(t), np.array([t, -t], dtype=float))
+    times, states = buffer.get()
+    assert np.shares_memory(times, buffer._times)
+    assert np.shares_memory(states, buffer._states)
+    np.testing.assert_array_equal(times, [7., 8., 9.])